@@ -1,65 +1,62 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
 from app.models.user import Profile as ProfileModel, Address as AddressOrmModel
 from app.schemas.user import  AddressModel,AddressUpdate, AddressCreate
-from app.core.auth import get_current_user
+from app.core.auth import Principal, get_current_user
 
 router = APIRouter()
 
 @router.get("/me", response_model=list[AddressModel])
-def get_my_addresses(
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+async def get_my_addresses(
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    # Get the logged-in user's profile
-    db_user = db.query(ProfileModel).filter(ProfileModel.firebase_uid == current_user["user_id"]).first()
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-
     # Return all addresses linked to this profile
-    return db_user.addresses
+    result = await db.execute(
+        select(AddressOrmModel)
+        .where(AddressOrmModel.profile_id == current_user.profile.id)
+        .order_by(AddressOrmModel.id)
+    )
+    return result.scalars().all()
 
 
 @router.post("/me", response_model=AddressModel)
-def add_my_address(
+async def add_my_address(
     address: AddressCreate,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     # Get the logged-in user's profile
-    db_user = db.query(ProfileModel).filter(ProfileModel.firebase_uid == current_user["user_id"]).first()
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+    profile = current_user.profile
 
     # Create a new address linked to the user
-    new_address = AddressOrmModel(**address.model_dump(), profile_id=db_user.id)
+    new_address = AddressOrmModel(**address.model_dump(), profile_id=profile.id)
 
     db.add(new_address)
-    db.commit()
-    db.refresh(new_address)
+    await db.commit()
+    await db.refresh(new_address)
 
     return new_address
 
 
 @router.patch("/me/{address_id}", response_model=AddressModel)
-def update_my_address(
+async def update_my_address(
     address_id: int,
     address: AddressUpdate,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     # Get the current user's profile
-    db_user = db.query(ProfileModel).filter(ProfileModel.firebase_uid == current_user["user_id"]).first()
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+    profile = current_user.profile
 
     # Get the address belonging to this user
-    db_address = (
-        db.query(AddressOrmModel)
-        .filter(AddressOrmModel.id == address_id, AddressOrmModel.profile_id == db_user.id)
-        .first()
+    result = await db.execute(
+        select(AddressOrmModel)
+        .where(AddressOrmModel.id == address_id, AddressOrmModel.profile_id == profile.id)
     )
+    db_address = result.scalars().first()
     if db_address is None:
         raise HTTPException(status_code=404, detail="Address not found")
 
@@ -68,30 +65,28 @@ def update_my_address(
     for key, value in update_data.items():
         setattr(db_address, key, value)
 
-    db.commit()
-    db.refresh(db_address)
+    await db.commit()
+    await db.refresh(db_address)
     return db_address
 
 
 #put address for user
 @router.put("/me/{address_id}", response_model=AddressModel)
-def replace_my_address(
+async def replace_my_address(
     address_id: int,
     address: AddressCreate,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     # Get the current user's profile
-    db_user = db.query(ProfileModel).filter(ProfileModel.firebase_uid == current_user["user_id"]).first()
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+    profile = current_user.profile
 
     # Get the address belonging to this user
-    db_address = (
-        db.query(AddressOrmModel)
-        .filter(AddressOrmModel.id == address_id, AddressOrmModel.profile_id == db_user.id)
-        .first()
+    result = await db.execute(
+        select(AddressOrmModel)
+        .where(AddressOrmModel.id == address_id, AddressOrmModel.profile_id == profile.id)
     )
+    db_address = result.scalars().first()
     if db_address is None:
         raise HTTPException(status_code=404, detail="Address not found")
 
@@ -99,34 +94,32 @@ def replace_my_address(
     for key, value in address.model_dump().items():
         setattr(db_address, key, value)
 
-    db.commit()
-    db.refresh(db_address)
+    await db.commit()
+    await db.refresh(db_address)
     return db_address
 
 
 #delete address for user
 @router.delete("/me/{address_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_my_address(
+async def delete_my_address(
     address_id: int,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     # Get the current user's profile
-    db_user = db.query(ProfileModel).filter(ProfileModel.firebase_uid == current_user["user_id"]).first()
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+    profile = current_user.profile
 
     # Get the address belonging to this user
-    db_address = (
-        db.query(AddressOrmModel)
-        .filter(AddressOrmModel.id == address_id, AddressOrmModel.profile_id == db_user.id)
-        .first()
+    result = await db.execute(
+        select(AddressOrmModel)
+        .where(AddressOrmModel.id == address_id, AddressOrmModel.profile_id == profile.id)
     )
+    db_address = result.scalars().first()
     if db_address is None:
         raise HTTPException(status_code=404, detail="Address not found")
 
-    db.delete(db_address)
-    db.commit()
+    await db.delete(db_address)
+    await db.commit()
     return None
 
 #set default address for user patch
@@ -0,0 +1,157 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_db
+from app.db.replicas import get_read_db
+from app.db.partitions import ORDER_LIST_DEFAULT_DAYS, created_window
+from app.models.restaurant import DeliveryPartner, Order, Restaurant
+from app.schemas.delivery import (
+    AvailabilityUpdate, DeliveryPartnerCreate, DeliveryPartnerResponse, DispatchResult, LocationPing
+)
+from app.schemas.order import OrderResponse
+from app.core.auth import Principal, check_role, check_any_role
+from app.core.dispatch import dispatcher
+from datetime import datetime
+from typing import Optional
+
+router = APIRouter()
+
+
+async def my_partner_id(db, current_user: Principal) -> int:
+    # Cached per worker: the ping endpoint must not query on every call
+    partner_id = dispatcher.grid.partner_for(current_user.profile.id)
+    if partner_id is None:
+        partner_id = (await db.execute(
+            select(DeliveryPartner.id).where(DeliveryPartner.profile_id == current_user.profile.id)
+        )).scalar()
+        if partner_id is None:
+            raise HTTPException(404, "Not registered as a delivery partner")
+        dispatcher.grid.remember_partner(current_user.profile.id, partner_id)
+    return partner_id
+
+
+# -------------------------------------------------------
+# POST /delivery/partners/me → Register as a delivery partner
+# -------------------------------------------------------
+@router.post("/partners/me", response_model=DeliveryPartnerResponse, status_code=201)
+async def register_partner(
+    body: DeliveryPartnerCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(check_role("delivery"))
+):
+    partner = (await db.execute(
+        pg_insert(DeliveryPartner)
+        .values(profile_id=current_user.profile.id, vehicle_type=body.vehicle_type)
+        .on_conflict_do_nothing(index_elements=[DeliveryPartner.profile_id])
+        .returning(DeliveryPartner)
+    )).scalars().first()
+    if partner is None:
+        raise HTTPException(409, "Already registered as a delivery partner")
+    await db.commit()
+
+    dispatcher.grid.remember_partner(current_user.profile.id, partner.id)
+    return partner
+
+
+# -------------------------------------------------------
+# GET /delivery/partners/me → Own partner record
+# -------------------------------------------------------
+@router.get("/partners/me", response_model=DeliveryPartnerResponse)
+async def get_my_partner(
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(check_role("delivery"))
+):
+    partner = (await db.execute(
+        select(DeliveryPartner).where(DeliveryPartner.profile_id == current_user.profile.id)
+    )).scalars().first()
+    if partner is None:
+        raise HTTPException(404, "Not registered as a delivery partner")
+    return partner
+
+
+# -------------------------------------------------------
+# PATCH /delivery/partners/me/availability → Go online / offline
+# -------------------------------------------------------
+@router.patch("/partners/me/availability", response_model=DeliveryPartnerResponse)
+async def update_availability(
+    body: AvailabilityUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(check_role("delivery"))
+):
+    partner_id = await my_partner_id(db, current_user)
+    partner = await dispatcher.set_availability(db, partner_id, body.status)
+    if partner is None:
+        raise HTTPException(409, "Finish the current delivery first")
+    return partner
+
+
+# -------------------------------------------------------
+# POST /delivery/partners/me/location → Location ping
+# Memory only; positions are written back in batches (app/core/dispatch.py)
+# -------------------------------------------------------
+@router.post("/partners/me/location", status_code=204)
+async def ping_location(
+    body: LocationPing,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(check_role("delivery"))
+):
+    partner_id = await my_partner_id(db, current_user)
+    dispatcher.grid.ping(partner_id, body.latitude, body.longitude)
+    return None
+
+
+# -------------------------------------------------------
+# GET /delivery/partners/me/orders → Orders assigned to me
+# -------------------------------------------------------
+@router.get("/partners/me/orders", response_model=list[OrderResponse])
+async def get_my_orders(
+    status: Optional[str] = Query(None),
+    created_from: Optional[datetime] = Query(None, description=f"Orders placed at or after this time (default {ORDER_LIST_DEFAULT_DAYS} days back)"),
+    created_to: Optional[datetime] = Query(None, description="Orders placed before this time"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(check_role("delivery"))
+):
+    partner_id = await my_partner_id(db, current_user)
+    query = (
+        select(Order)
+        .options(selectinload(Order.status_history))
+        .where(Order.delivery_person_id == partner_id, *created_window(Order.created_at, created_from, created_to))
+        .order_by(Order.created_at.desc(), Order.id.desc())
+    )
+    if status:
+        query = query.where(Order.status == status)
+
+    result = await db.execute(query)
+    return result.scalars().all()
+
+
+# -------------------------------------------------------
+# POST /delivery/dispatch → Assign ready orders to the nearest free drivers
+# Restaurant owners dispatch their own orders; every restaurant at once is admin only
+# -------------------------------------------------------
+@router.post("/dispatch", response_model=DispatchResult)
+async def dispatch_orders(
+    restaurant_id: Optional[int] = Query(None, description="Required unless admin"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(check_any_role(["restaurant", "admin"]))
+):
+    if not current_user.has_role("admin"):
+        if restaurant_id is None:
+            raise HTTPException(403, "Only admins can dispatch every restaurant's orders")
+        restaurant = (await db.execute(
+            select(Restaurant.id, Restaurant.owner_id).where(Restaurant.id == restaurant_id)
+        )).first()
+        if restaurant is None:
+            raise HTTPException(404, "Restaurant not found")
+        if restaurant.owner_id != current_user.profile.id:
+            raise HTTPException(403, "Not your restaurant")
+
+    assigned = await dispatcher.dispatch_ready_orders(db, restaurant_id=restaurant_id)
+    return {
+        "assigned": [
+            {"order_id": order_id, "delivery_person_id": partner_id, "distance_km": distance}
+            for order_id, partner_id, distance in assigned
+        ]
+    }
@@ -1,18 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import Boolean, Integer, String, cast, column, func, insert, select, update, values
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal
 
 from app.db.session import get_db
-from app.models.restaurant import MenuItem, MenuCategory
+from app.db.replicas import get_read_db
+from app.models.restaurant import MenuItem, MenuItemSales, MenuCategory, Restaurant, utcnow
 from app.schemas.menu import (
     MenuItemCreate,
     MenuItemUpdate,
     MenuItemResponse,
     MenuCategoryResponse,
+    FullMenuResponse,
+    MenuItemBulkRequest,
+    MenuItemBulkResponse,
+    MenuItemBulkResult,
+    PopularMenuItem,
 )
 from app.core.auth import (
+    Principal,
     get_current_user,
     check_any_role,
 )
+from app.core.http_cache import PUBLIC_MENU_CACHE_CONTROL, etag_matches, make_etag, not_modified, set_cache_headers
+from app.core.menu_cache import build_menu_snapshot, bump_menu_version, full_menu_etag, menu_snapshots
 
 router = APIRouter()
 
@@ -32,12 +44,88 @@ def ManagerOrAdmin():
     response_model=list[MenuItemResponse],
     summary="Get menu for a restaurant",
 )
-def get_menu_for_restaurant(
+async def get_menu_for_restaurant(
     restaurant_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
 ):
-    items = db.query(MenuItem).filter(MenuItem.restaurant_id == restaurant_id).all()
-    return items
+    # 🏷️ Conditional GET: the version is read before the items, so an ETag can
+    # only ever label data at least as new as itself
+    menu_version = await db.scalar(select(Restaurant.menu_version).where(Restaurant.id == restaurant_id))
+    if menu_version is not None:
+        etag = make_etag("menu", restaurant_id, menu_version)
+        if etag_matches(request, etag):
+            return not_modified(etag, PUBLIC_MENU_CACHE_CONTROL)
+        set_cache_headers(response, etag, PUBLIC_MENU_CACHE_CONTROL)
+
+    result = await db.execute(select(MenuItem).where(MenuItem.restaurant_id == restaurant_id))
+    return result.scalars().all()
+
+
+@router.get(
+    "/restaurants/{restaurant_id}/full",
+    response_model=FullMenuResponse,
+    summary="Get the full menu (categories with available items)",
+)
+async def get_full_menu_for_restaurant(
+    restaurant_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+):
+    menu_version = await db.scalar(select(Restaurant.menu_version).where(Restaurant.id == restaurant_id))
+    if menu_version is None:
+        raise HTTPException(404, "Restaurant not found")
+
+    etag = full_menu_etag(restaurant_id, menu_version)
+    if etag_matches(request, etag):
+        return not_modified(etag, PUBLIC_MENU_CACHE_CONTROL)
+
+    # ⚡ Serve the pre-serialized bytes; rebuild only after a menu change
+    snapshot = menu_snapshots.get(restaurant_id, menu_version)
+    if snapshot is None:
+        snapshot = await build_menu_snapshot(db, restaurant_id, menu_version)
+        menu_snapshots.put(snapshot)
+
+    response = Response(content=snapshot.body, media_type="application/json")
+    set_cache_headers(response, snapshot.etag, PUBLIC_MENU_CACHE_CONTROL)
+    return response
+
+
+@router.get(
+    "/restaurants/{restaurant_id}/popular",
+    response_model=list[PopularMenuItem],
+    summary="Best-selling available items",
+)
+async def get_popular_items(
+    restaurant_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    ranking: Literal["trending", "all_time"] = Query(
+        "trending", description="trending: recent sales weigh more; all_time: total units sold"
+    ),
+    db: AsyncSession = Depends(get_read_db),
+):
+    # 📊 Reads the precomputed counters (app/core/menu_popularity.py) through
+    # a per-restaurant index; order JSONB is never unpacked here
+    rank = MenuItemSales.score if ranking == "trending" else MenuItemSales.units_sold
+    result = await db.execute(
+        select(MenuItem, MenuItemSales.units_sold, MenuItemSales.order_count, MenuItemSales.score)
+        .join(MenuItemSales, MenuItemSales.menu_item_id == MenuItem.id)
+        .where(
+            MenuItemSales.restaurant_id == restaurant_id,
+            MenuItemSales.units_sold > 0,
+            MenuItem.is_available.is_(True),
+        )
+        .order_by(rank.desc(), MenuItem.id)
+        .limit(limit)
+    )
+    return [
+        PopularMenuItem.model_validate(
+            {**MenuItemResponse.model_validate(item, from_attributes=True).model_dump(),
+             "units_sold": units_sold, "order_count": order_count, "score": score}
+        )
+        for item, units_sold, order_count, score in result.all()
+    ]
 
 
 @router.get(
@@ -45,11 +133,11 @@ def get_menu_for_restaurant(
     response_model=MenuItemResponse,
     summary="Get menu item details",
 )
-def get_menu_item(
+async def get_menu_item(
     item_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    item = db.query(MenuItem).filter(MenuItem.id == item_id).first()
+    item = await db.get(MenuItem, item_id)
     if not item:
         raise HTTPException(404, "Menu item not found")
     return item
@@ -60,10 +148,11 @@ def get_menu_item(
     response_model=list[MenuCategoryResponse],
     summary="Get global menu categories",
 )
-def get_global_categories(
-    db: Session = Depends(get_db),
+async def get_global_categories(
+    db: AsyncSession = Depends(get_read_db),
 ):
-    return db.query(MenuCategory).all()
+    result = await db.execute(select(MenuCategory))
+    return result.scalars().all()
 
 
 # ===========================================================================
@@ -76,10 +165,10 @@ def get_global_categories(
     status_code=201,
     summary="Add new menu item",
 )
-def add_menu_item(
+async def add_menu_item(
     restaurant_id: int,
     item: MenuItemCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _ = Depends(ManagerOrAdmin),  # auth applied here
 ):
     if item.restaurant_id != restaurant_id:
@@ -90,8 +179,9 @@ def add_menu_item(
 
     new_item = MenuItem(**item.dict())
     db.add(new_item)
-    db.commit()
-    db.refresh(new_item)
+    await bump_menu_version(db, restaurant_id)
+    await db.commit()
+    await db.refresh(new_item)
     return new_item
 
 
@@ -100,21 +190,24 @@ def add_menu_item(
     response_model=MenuItemResponse,
     summary="Update full menu item",
 )
-def update_menu_item(
+async def update_menu_item(
     item_id: int,
     payload: MenuItemCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _ = Depends(ManagerOrAdmin),
 ):
-    item = db.query(MenuItem).filter(MenuItem.id == item_id).first()
+    item = await db.get(MenuItem, item_id)
     if not item:
         raise HTTPException(404, "Menu item not found")
 
+    # An item moved to another restaurant changes both menus
+    previous_restaurant_id = item.restaurant_id
     for key, value in payload.dict().items():
         setattr(item, key, value)
 
-    db.commit()
-    db.refresh(item)
+    await bump_menu_version(db, previous_restaurant_id, item.restaurant_id)
+    await db.commit()
+    await db.refresh(item)
     return item
 
 
@@ -123,21 +216,22 @@ def update_menu_item(
     response_model=MenuItemResponse,
     summary="Partially update menu item",
 )
-def patch_menu_item(
+async def patch_menu_item(
     item_id: int,
     payload: MenuItemUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _ = Depends(ManagerOrAdmin),
 ):
-    item = db.query(MenuItem).filter(MenuItem.id == item_id).first()
+    item = await db.get(MenuItem, item_id)
     if not item:
         raise HTTPException(404, "Menu item not found")
 
     for key, value in payload.dict(exclude_unset=True).items():
         setattr(item, key, value)
 
-    db.commit()
-    db.refresh(item)
+    await bump_menu_version(db, item.restaurant_id)
+    await db.commit()
+    await db.refresh(item)
     return item
 
 
@@ -146,15 +240,144 @@ def patch_menu_item(
     status_code=204,
     summary="Delete menu item",
 )
-def delete_menu_item(
+async def delete_menu_item(
     item_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _ = Depends(ManagerOrAdmin),
 ):
-    item = db.query(MenuItem).filter(MenuItem.id == item_id).first()
+    item = await db.get(MenuItem, item_id)
     if not item:
         raise HTTPException(404, "Menu item not found")
 
-    db.delete(item)
-    db.commit()
+    await db.delete(item)
+    await bump_menu_version(db, item.restaurant_id)
+    await db.commit()
     return
+
+
+@router.post(
+    "/restaurants/{restaurant_id}/items:bulk",
+    response_model=MenuItemBulkResponse,
+    summary="Create or update many menu items in one transaction",
+)
+async def bulk_upsert_menu_items(
+    restaurant_id: int,
+    payload: MenuItemBulkRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(ManagerOrAdmin()),
+):
+    restaurant = (await db.execute(
+        select(Restaurant.id, Restaurant.owner_id).where(Restaurant.id == restaurant_id)
+    )).first()
+    if restaurant is None:
+        raise HTTPException(404, "Restaurant not found")
+    if not current_user.has_role("admin") and restaurant.owner_id != current_user.profile.id:
+        raise HTTPException(403, "Not your restaurant")
+
+    operations = payload.items
+    results = [None] * len(operations)
+
+    def fail(index, detail, item_id=None):
+        results[index] = MenuItemBulkResult(index=index, id=item_id, status="error", detail=detail)
+
+    # 🔍 Referenced categories must belong to this restaurant (one query for all)
+    category_ids = {op.category_id for op in operations if op.category_id is not None}
+    valid_categories = set()
+    if category_ids:
+        valid_categories = set((await db.scalars(
+            select(MenuCategory.id).where(
+                MenuCategory.restaurant_id == restaurant_id,
+                MenuCategory.id.in_(category_ids),
+            )
+        )).all())
+
+    creates, updates, update_ids = [], [], set()
+    for index, op in enumerate(operations):
+        if op.category_id is not None and op.category_id not in valid_categories:
+            fail(index, "Category not found for this restaurant", op.id)
+        elif op.id is None:
+            if op.name is None or op.price is None or op.category_id is None:
+                fail(index, "name, price and category_id are required to create an item")
+            else:
+                creates.append((index, op))
+        elif op.id in update_ids:
+            fail(index, "Item appears more than once in this batch", op.id)
+        else:
+            update_ids.add(op.id)
+            updates.append((index, op))
+
+    try:
+        # ✏️ All updates in one UPDATE ... FROM (VALUES ...); NULL keeps the current value.
+        # A VALUES column that is NULL in every row is typed text, hence the casts.
+        def keep_unless_set(new, current):
+            return func.coalesce(cast(new, current.type), current)
+
+        if updates:
+            changes = values(
+                column("id", Integer),
+                column("category_id", Integer),
+                column("name", String),
+                column("description", String),
+                column("price", MenuItem.price.type),
+                column("is_available", Boolean),
+                name="changes",
+            ).data([
+                (op.id, op.category_id, op.name, op.description, op.price, op.is_available)
+                for _, op in updates
+            ])
+            result = await db.execute(
+                update(MenuItem)
+                .where(MenuItem.id == changes.c.id, MenuItem.restaurant_id == restaurant_id)
+                .values(
+                    category_id=keep_unless_set(changes.c.category_id, MenuItem.category_id),
+                    name=keep_unless_set(changes.c.name, MenuItem.name),
+                    description=keep_unless_set(changes.c.description, MenuItem.description),
+                    price=keep_unless_set(changes.c.price, MenuItem.price),
+                    is_available=keep_unless_set(changes.c.is_available, MenuItem.is_available),
+                    updated_at=utcnow(),
+                )
+                .returning(MenuItem.id),
+                execution_options={"synchronize_session": False},
+            )
+            updated_ids = set(result.scalars().all())
+            for index, op in updates:
+                if op.id in updated_ids:
+                    results[index] = MenuItemBulkResult(index=index, id=op.id, status="updated")
+                else:
+                    fail(index, "Menu item not found for this restaurant", op.id)
+
+        # ➕ All creates in one multi-row INSERT ... RETURNING, ids in request order
+        if creates:
+            created_ids = (await db.scalars(
+                insert(MenuItem).returning(MenuItem.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "restaurant_id": restaurant_id,
+                        "category_id": op.category_id,
+                        "name": op.name,
+                        "description": op.description,
+                        "price": op.price,
+                        "is_available": True if op.is_available is None else op.is_available,
+                    }
+                    for _, op in creates
+                ],
+            )).all()
+            for (index, _), item_id in zip(creates, created_ids):
+                results[index] = MenuItemBulkResult(index=index, id=item_id, status="created")
+
+        if any(outcome.status != "error" for outcome in results):
+            await bump_menu_version(db, restaurant_id)
+        menu_version = await db.scalar(select(Restaurant.menu_version).where(Restaurant.id == restaurant_id))
+        await db.commit()
+
+    except IntegrityError as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=f"Bulk update rejected: {str(e.orig)}")
+
+    return MenuItemBulkResponse(
+        menu_version=menu_version,
+        created=sum(outcome.status == "created" for outcome in results),
+        updated=sum(outcome.status == "updated" for outcome in results),
+        failed=sum(outcome.status == "error" for outcome in results),
+        results=results,
+    )
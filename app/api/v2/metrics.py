@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends
+from app.core.auth import check_role
+from app.core.session_cache import session_cache
+from app.core.revocation import revocation_watermarks
+from app.core.profile_cache import profile_cache
+from app.core.menu_cache import menu_snapshots
+from app.core.cart_store import cart_store
+from app.core.idempotency import idempotency_cache
+from app.core.order_feed import order_feed
+from app.core.dispatch import dispatcher
+from app.db.listener import pg_listener
+from app.db.maintenance import maintenance
+from app.db.session import pool_stats
+from app.db.replicas import replica_pool_stats
+
+router = APIRouter()
+
+
+# -------------------------------------------------------
+# GET /metrics/auth → Auth cache counters (admin only)
+# -------------------------------------------------------
+@router.get("/auth", description="Session, revocation and profile cache statistics (admin only)")
+async def auth_cache_stats(_ = Depends(check_role("admin"))):
+    return {
+        "session_cache": session_cache.stats(),
+        "revocation": revocation_watermarks.stats(),
+        "profile_cache": profile_cache.stats(),
+        "listener": pg_listener.stats(),
+    }
+
+
+# -------------------------------------------------------
+# GET /metrics/db → Connection pool occupancy, checkout waits and maintenance jobs (admin only)
+# -------------------------------------------------------
+@router.get("/db", description="Database connection pool and maintenance job statistics (admin only)")
+async def db_pool_stats(_ = Depends(check_role("admin"))):
+    stats = pool_stats()
+    stats["pools"].update(replica_pool_stats())
+    stats["maintenance"] = maintenance.stats()
+    return stats
+
+
+# -------------------------------------------------------
+# GET /metrics/menu → Full-menu snapshot cache counters (admin only)
+# -------------------------------------------------------
+@router.get("/menu", description="Full-menu snapshot cache statistics (admin only)")
+async def menu_cache_stats(_ = Depends(check_role("admin"))):
+    return {"menu_snapshots": menu_snapshots.stats()}
+
+
+# -------------------------------------------------------
+# GET /metrics/cart → Cart store backend and flush counters (admin only)
+# -------------------------------------------------------
+@router.get("/cart", description="Cart store statistics (admin only)")
+async def cart_store_stats(_ = Depends(check_role("admin"))):
+    return {"cart_store": cart_store.stats()}
+
+
+# -------------------------------------------------------
+# GET /metrics/orders → Idempotency-Key replays and live feed fan-out (admin only)
+# -------------------------------------------------------
+@router.get("/orders", description="Order idempotency cache and live feed statistics (admin only)")
+async def order_stats(_ = Depends(check_role("admin"))):
+    return {"idempotency": idempotency_cache.stats(), "live_feed": order_feed.stats()}
+
+
+# -------------------------------------------------------
+# GET /metrics/dispatch → Driver grid, location flushes and assignments (admin only)
+# -------------------------------------------------------
+@router.get("/dispatch", description="Driver grid and dispatcher statistics (admin only)")
+async def dispatch_stats(_ = Depends(check_role("admin"))):
+    return dispatcher.stats()
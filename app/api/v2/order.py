@@ -1,41 +1,128 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import DateTime, String, bindparam, delete, func, insert, literal, select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
-from app.models.restaurant import Order, OrderStatusHistory
+from app.db.replicas import get_read_db
+from app.db.partitions import ORDER_LIST_DEFAULT_DAYS, created_window
+from app.models.restaurant import Cart, CartItem, MenuItem, Order, OrderStatusHistory, Restaurant, utcnow
 from app.models.user import Profile
 from app.schemas.order import (
+    MAX_ORDER_LINE_QUANTITY,
+    CheckoutRequest,
     OrderCreate,
     OrderResponse,
+    OrderSummary,
     OrderStatusUpdate,
     OrderCancel
 )
-from app.core.auth import get_current_user, check_role, check_any_role
-from datetime import datetime
+from app.core.auth import Principal, get_current_user, check_role, check_any_role
+from app.core.cart_store import cart_store
+from app.core.idempotency import IDEMPOTENCY_HEADER, IdempotentRequest
+from app.core.order_feed import END_OF_STREAM, ORDER_FEED_HEARTBEAT, notify_order_event, order_feed, sse_message
+from app.core.order_status import ACTIVE_ORDER_STATUSES, CANCELLED, DELIVERED, ORDER_STATUSES, REJECTED, sources_of
+from app.core.dispatch import dispatcher
+from app.core.sales_rollup import record_order_placed, record_status_change
+from app.core.menu_popularity import record_items_sold, record_items_status_change
+from app.core.pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, after_key, decode_cursor, encode_cursor
+from datetime import datetime, timezone
+from typing import List, Optional
+import os
 import uuid
 
 router = APIRouter()
 
 
+# 🔹 Server-side pricing for checkout
+CHECKOUT_DELIVERY_FEE = int(os.getenv("CHECKOUT_DELIVERY_FEE", "0"))  # order_type == "delivery" only
+CHECKOUT_TAX_RATE = float(os.getenv("CHECKOUT_TAX_RATE", "0"))         # fraction of the subtotal
+
+
+# OrderResponse serializes status_history, which AsyncSession cannot lazy-load,
+# so every order that is returned goes through these.
+def orders_with_history():
+    return select(Order).options(selectinload(Order.status_history))
+
+
+def new_order_number() -> str:
+    # orders is partitioned, so the database can't keep order_number unique;
+    # with 64 random bits the odds of any collision are about 0.03% at 100M
+    # orders and 3% at a billion
+    return f"ORD-{uuid.uuid4().hex[:16].upper()}"
+
+
+async def load_order(db, order_id):
+    # By id alone: one primary key probe per attached month (no pruning)
+    result = await db.execute(orders_with_history().where(Order.id == order_id))
+    return result.scalars().first()
+
+
+async def commit_new_order(db, new_order, status_code, idempotent=None):
+    """
+    Insert an order built with its first status_history entry: one flush
+    (INSERT ... RETURNING for the order, then the history row) and one
+    commit, which also publishes it to the live restaurant feed and adds it
+    to the restaurant's sales rollup and best-seller counters. With an
+    idempotency key the serialized response is stored in the same
+    transaction and returned as bytes.
+    """
+    db.add(new_order)
+    await db.flush()
+    await record_order_placed(db, new_order)
+    await record_items_sold(db, new_order)
+    await notify_order_event(db, "created", new_order)
+    if idempotent is None:
+        await db.commit()
+        return new_order
+
+    body = OrderResponse.model_validate(new_order).model_dump_json().encode()
+    stored = await idempotent.save_response(db, status_code, body)
+    if stored is None:
+        # A concurrent retry with the same key committed first
+        await db.rollback()
+        replayed = await idempotent.stored_response(db)
+        if replayed is None:
+            raise HTTPException(409, "A request with this Idempotency-Key is already in progress")
+        return replayed
+
+    await db.commit()
+    idempotent.remember(stored)
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+
 # -------------------------------------------------------
 # POST /orders → Place new order
 # -------------------------------------------------------
 @router.post("/", response_model=OrderResponse)
-def place_order(
+async def place_order(
     order: OrderCreate,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
 ):
+    user = current_user.profile
+
+    # 🔁 A retried request gets the original order back; the orders table isn't touched
+    idempotent = IdempotentRequest.from_header(user.id, "orders", idempotency_key, order)
+    if idempotent:
+        replayed = await idempotent.stored_response(db)
+        if replayed is not None:
+            return replayed
+
     # create unique order no
-    order_number = f"ORD-{uuid.uuid4().hex[:10].upper()}"
+    order_number = new_order_number()
 
     new_order = Order(
         order_number=order_number,
-        user_id=current_user["db_user"].id,
+        user_id=user.id,
         restaurant_id=order.restaurant_id,
         delivery_address_id=order.delivery_address_id,
         order_type=order.order_type,
         status="pending",
-        items=order.items,
+        items=[line.model_dump() for line in order.items],
         subtotal_amount=order.subtotal_amount,
         discount_amount=order.discount_amount,
         delivery_fee=order.delivery_fee,
@@ -44,143 +131,370 @@ def place_order(
         payment_method=order.payment_method,
         special_instructions=order.special_instructions,
         scheduled_time=order.scheduled_time,
+        status_history=[OrderStatusHistory(status="pending", updated_by=user.full_name)],
     )
 
-    db.add(new_order)
-    db.commit()
-    db.refresh(new_order)
+    return await commit_new_order(db, new_order, status.HTTP_200_OK, idempotent)
 
-    # Add status history
-    history = OrderStatusHistory(
-        order_id=new_order.id,
-        status="pending",
-        updated_by=current_user["db_user"].full_name,
-    )
-    db.add(history)
-    db.commit()
 
-    return new_order
+# -------------------------------------------------------
+# POST /orders/checkout → Turn the user's cart into an order
+# -------------------------------------------------------
+@router.post("/checkout", response_model=OrderResponse, status_code=201)
+async def checkout(
+    body: CheckoutRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+):
+    """
+    One transaction: lock the cart, price its lines against the current menu
+    in one query, insert the order with its first status entry and empty
+    the cart. Client-side amounts are never trusted.
+    """
+    user = current_user.profile
+
+    idempotent = IdempotentRequest.from_header(user.id, "checkout", idempotency_key, body)
+    if idempotent:
+        replayed = idempotent.cached_response()
+        if replayed is not None:
+            return replayed
+
+    async with cart_store.checkout(db, user.id):
+        try:
+            # 🔒 Concurrent cart writes (and a second checkout) wait for this transaction
+            cart_id = await db.scalar(select(Cart.id).where(Cart.user_id == user.id).with_for_update())
+
+            # Checked under the lock: a retry that waited on it sees the first attempt's order
+            if idempotent:
+                replayed = await idempotent.stored_response(db)
+                if replayed is not None:
+                    await db.rollback()
+                    return replayed
+
+            lines = [] if cart_id is None else (await db.execute(
+                select(
+                    CartItem.menu_item_id,
+                    CartItem.restaurant_id,
+                    CartItem.quantity,
+                    CartItem.notes,
+                    MenuItem.name,
+                    MenuItem.price,
+                    MenuItem.is_available,
+                    Restaurant.is_active,
+                    Restaurant.minimum_order_amount,
+                )
+                .join(MenuItem, MenuItem.id == CartItem.menu_item_id)
+                .join(Restaurant, Restaurant.id == CartItem.restaurant_id)
+                .where(CartItem.cart_id == cart_id)
+                .order_by(CartItem.id)
+            )).all()
+
+            if not lines:
+                raise HTTPException(400, "Cart is empty")
+            if len({line.restaurant_id for line in lines}) > 1:
+                raise HTTPException(400, "Cart contains items from more than one restaurant")
+            if not lines[0].is_active:
+                raise HTTPException(409, "Restaurant is not accepting orders")
+            unavailable = [line.name for line in lines if not line.is_available]
+            if unavailable:
+                raise HTTPException(409, f"No longer available: {', '.join(unavailable)}")
+            oversized = [line.name for line in lines if line.quantity > MAX_ORDER_LINE_QUANTITY]
+            if oversized:
+                raise HTTPException(400, f"At most {MAX_ORDER_LINE_QUANTITY} of each item: {', '.join(oversized)}")
+
+            items = [
+                {
+                    "item_id": line.menu_item_id,
+                    "name": line.name,
+                    "quantity": line.quantity,
+                    "price": line.price,
+                    "total": line.price * line.quantity,
+                    "notes": line.notes,
+                }
+                for line in lines
+            ]
+            subtotal = sum(item["total"] for item in items)
+            minimum = lines[0].minimum_order_amount or 0
+            if subtotal < minimum:
+                raise HTTPException(400, f"Minimum order amount is {minimum}")
+
+            delivery_fee = CHECKOUT_DELIVERY_FEE if body.order_type == "delivery" else 0
+            tax = round(subtotal * CHECKOUT_TAX_RATE)
+
+            new_order = Order(
+                order_number=new_order_number(),
+                user_id=user.id,
+                restaurant_id=lines[0].restaurant_id,
+                delivery_address_id=body.delivery_address_id,
+                order_type=body.order_type,
+                status="pending",
+                items=items,
+                subtotal_amount=subtotal,
+                discount_amount=0,
+                delivery_fee=delivery_fee,
+                tax_amount=tax,
+                total_amount=subtotal + delivery_fee + tax,
+                payment_method=body.payment_method,
+                special_instructions=body.special_instructions,
+                scheduled_time=body.scheduled_time,
+                status_history=[OrderStatusHistory(status="pending", updated_by=user.full_name)],
+            )
+
+            await db.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+            await db.execute(
+                update(Cart)
+                .where(Cart.id == cart_id)
+                .values(total_amount=0, total_items=0, updated_at=utcnow()),
+                execution_options={"synchronize_session": False},
+            )
+            return await commit_new_order(db, new_order, status.HTTP_201_CREATED, idempotent)
+
+        except HTTPException:
+            await db.rollback()
+            raise
 
 
 # -------------------------------------------------------
-# GET /orders → List all user orders
+# GET /orders → User order history (summaries, newest first)
 # -------------------------------------------------------
-@router.get("/", response_model=list[OrderResponse])
-def list_user_orders(
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
-):
-    orders = db.query(Order).filter(
-        Order.user_id == current_user["db_user"].id
-    ).order_by(Order.id.desc()).all()
+# Columns of OrderSummary, read without the items JSONB or any history rows
+SUMMARY_COLUMNS = (
+    Order.id,
+    Order.order_number,
+    Order.restaurant_id,
+    Order.delivery_person_id,
+    Order.order_type,
+    Order.status,
+    Order.version,
+    Order.total_amount,
+    Order.payment_status,
+    Order.scheduled_time,
+    Order.created_at,
+    Order.updated_at,
+)
+
 
-    return orders
+def as_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Columns are naive UTC; convert aware query parameters
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def history_cursor_key(cursor: str):
+    after = decode_cursor(cursor).get("after")
+    try:
+        created_at, order_id = after
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+@router.get("/", response_model=list[OrderSummary])
+async def list_user_orders(
+    response: Response,
+    order_status: Optional[List[str]] = Query(None, alias="status", description="Only orders in these statuses (repeatable)"),
+    created_from: Optional[datetime] = Query(None, description="Orders placed at or after this time"),
+    created_to: Optional[datetime] = Query(None, description="Orders placed before this time"),
+    size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from the {NEXT_CURSOR_HEADER} header"),
+    include_total: bool = Query(False, description=f"Return the number of matches in the {TOTAL_COUNT_HEADER} header"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    # 📊 Newest first on (created_at, id): each page is one range scan of
+    # ix_orders_user_created_id, however deep the client has scrolled
+    sort_key = (Order.created_at, Order.id)
+    query = select(*SUMMARY_COLUMNS).where(Order.user_id == current_user.profile.id)
+
+    if order_status:
+        query = query.where(Order.status.in_(order_status))
+    if created_from is not None:
+        query = query.where(Order.created_at >= as_naive_utc(created_from))
+    if created_to is not None:
+        query = query.where(Order.created_at < as_naive_utc(created_to))
+
+    # 🔢 Total only on request; it has to visit every match
+    if include_total:
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+        response.headers[TOTAL_COUNT_HEADER] = str(total)
+
+    if cursor:
+        after = history_cursor_key(cursor)
+        # The row comparison alone doesn't prune partitions; the plain bound does
+        query = query.where(after_key(sort_key, after, descending=True), Order.created_at <= after[0])
+
+    # Fetch one extra row to learn whether there is a next page
+    result = await db.execute(query.order_by(*(col.desc() for col in sort_key)).limit(size + 1))
+    rows = result.all()
+
+    if len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            {"after": [last.created_at.isoformat(), last.id]}
+        )
+
+    return rows
 
 
 # -------------------------------------------------------
 # GET /orders/{id} → Order details
 # -------------------------------------------------------
 @router.get("/{id}", response_model=OrderResponse)
-def get_order_details(
+async def get_order_details(
     id: int,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    order = db.query(Order).filter(Order.id == id).first()
+    order = await load_order(db, id)
 
     if not order:
         raise HTTPException(404, "Order not found")
 
     # User can only access their own order
-    if order.user_id != current_user["db_user"].id:
+    if order.user_id != current_user.profile.id:
         raise HTTPException(403, "Not your order")
 
     return order
 
 
+# -------------------------------------------------------
+# Status changes — optimistic concurrency
+# -------------------------------------------------------
+# SQLSTATE of FOR UPDATE NOWAIT finding the row already locked
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+async def transition_order(db, order_id, target, updated_by, expected_version=None, owner_id=None):
+    """
+    Move an order to `target` and commit. One statement does the state
+    change: a NOWAIT row lock, the conditional UPDATE (allowed source
+    status, and the caller's version if given) and the history INSERT, as
+    CTEs. A writer that finds the row locked or already moved gets 409 at
+    once instead of waiting. The driver release, rollups, best-seller
+    counters and feed event follow from the UPDATE's RETURNING row, so the
+    lock is held for those few statements and the commit only; the order
+    is reloaded with its history after the commit.
+    """
+    if target not in ORDER_STATUSES:
+        raise HTTPException(400, f"Unknown status '{target}'")
+
+    conditions = [Order.status.in_(sources_of(target))]
+    if expected_version is not None:
+        conditions.append(Order.version == expected_version)
+    if owner_id is not None:
+        conditions.append(Order.user_id == owner_id)
+
+    now = utcnow()
+    locked = (
+        select(Order.id, Order.created_at)
+        .where(Order.id == order_id)
+        .with_for_update(nowait=True)
+        .cte("locked")
+    )
+    moved = (
+        update(Order)
+        .where(Order.id == locked.c.id, Order.created_at == locked.c.created_at, *conditions)
+        .values(status=target, version=Order.version + 1, updated_at=now)
+        .returning(*SUMMARY_COLUMNS, Order.items)
+        .cte("moved")
+    )
+    history = (
+        insert(OrderStatusHistory)
+        .from_select(
+            ["order_id", "order_created_at", "status", "updated_by", "timestamp"],
+            select(moved.c.id, moved.c.created_at, moved.c.status, literal(updated_by, String), literal(now, DateTime)),
+        )
+        .cte("history")
+    )
+    stmt = select(moved).add_cte(locked, history)
+
+    try:
+        row = (await db.execute(stmt)).first()
+    except DBAPIError as e:
+        if getattr(e.orig, "sqlstate", None) != LOCK_NOT_AVAILABLE:
+            raise
+        await db.rollback()
+        raise HTTPException(409, "Order is being updated by another request; reload and retry")
+
+    if row is None:
+        # Work out why, only on the failure path
+        current = (await db.execute(
+            select(Order.status, Order.version, Order.user_id).where(Order.id == order_id)
+        )).first()
+        await db.rollback()
+        if current is None:
+            raise HTTPException(404, "Order not found")
+        if owner_id is not None and current.user_id != owner_id:
+            raise HTTPException(403, "Not your order")
+        raise HTTPException(
+            409,
+            f"Order is '{current.status}' (version {current.version}); cannot move to '{target}'",
+        )
+
+    if target in (DELIVERED, CANCELLED, REJECTED) and row.delivery_person_id is not None:
+        # The driver is free for the next dispatch once this commits
+        await dispatcher.release_partner(db, row.delivery_person_id)
+    await record_status_change(db, row, target)
+    await record_items_status_change(db, row, target)
+    await notify_order_event(db, "status", row)
+    await db.commit()
+
+    # Both key columns: the reload reads only the order's own partition
+    result = await db.execute(
+        orders_with_history().where(Order.id == row.id, Order.created_at == row.created_at),
+        execution_options={"populate_existing": True},
+    )
+    return result.scalars().one()
+
+
 # -------------------------------------------------------
 # PATCH /orders/{id}/status → Restaurant or delivery update
 # -------------------------------------------------------
 @router.patch("/{id}/status", response_model=OrderResponse)
-def update_order_status(
+async def update_order_status(
     id: int,
     data: OrderStatusUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _ = Depends(check_any_role(["restaurant", "delivery", "admin"]))
 ):
-    order = db.query(Order).filter(Order.id == id).first()
-
-    if not order:
-        raise HTTPException(404, "Order not found")
-
-    order.status = data.status
-    order.updated_at = datetime.utcnow()
-
-    # Add history
-    log = OrderStatusHistory(
-        order_id=id,
-        status=data.status,
-        updated_by=data.updated_by
-    )
-
-    db.add(log)
-    db.commit()
-    db.refresh(order)
-
-    return order
+    return await transition_order(db, id, data.status, data.updated_by, expected_version=data.version)
 
 
 # -------------------------------------------------------
 # PATCH /orders/{id}/cancel → User cancel order
 # -------------------------------------------------------
 @router.patch("/{id}/cancel", response_model=OrderResponse)
-def cancel_order(
+async def cancel_order(
     id: int,
     data: OrderCancel,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    order = db.query(Order).filter(Order.id == id).first()
-
-    if not order:
-        raise HTTPException(404, "Order not found")
-
-    if order.user_id != current_user["db_user"].id:
-        raise HTTPException(403, "You cannot cancel this order")
-
-    if order.status not in ["pending", "accepted"]:
-        raise HTTPException(400, "Order cannot be cancelled")
-
-    order.status = "cancelled"
-
-    log = OrderStatusHistory(
-        order_id=id,
-        status="cancelled",
-        updated_by=current_user["db_user"].full_name
+    # Only pending/accepted orders can move to cancelled (ORDER_TRANSITIONS)
+    return await transition_order(
+        db, id, CANCELLED, current_user.profile.full_name,
+        expected_version=data.version, owner_id=current_user.profile.id,
     )
 
-    db.add(log)
-    db.commit()
-    db.refresh(order)
-
-    return order
-
 
 # -------------------------------------------------------
 # GET /orders/{id}/track → Tracking data
 # -------------------------------------------------------
 @router.get("/{id}/track", response_model=OrderResponse)
-def track_order(
+async def track_order(
     id: int,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    order = db.query(Order).filter(Order.id == id).first()
+    order = await load_order(db, id)
 
     if not order:
         raise HTTPException(404, "Order not found")
 
-    if order.user_id != current_user["db_user"].id:
+    if order.user_id != current_user.profile.id:
         raise HTTPException(403, "Not your order")
 
     return order
@@ -190,49 +504,132 @@ def track_order(
 # GET /orders/restaurant/{id} → Restaurant orders
 # -------------------------------------------------------
 @router.get("/restaurant/{restaurant_id}", response_model=list[OrderResponse])
-def get_restaurant_orders(
+async def get_restaurant_orders(
     restaurant_id: int,
-    db: Session = Depends(get_db),
+    created_from: Optional[datetime] = Query(None, description=f"Orders placed at or after this time (default {ORDER_LIST_DEFAULT_DAYS} days back)"),
+    created_to: Optional[datetime] = Query(None, description="Orders placed before this time"),
+    db: AsyncSession = Depends(get_read_db),
     _ = Depends(check_role("restaurant"))
 ):
-    orders = db.query(Order).filter(
-        Order.restaurant_id == restaurant_id
-    ).all()
+    # The created_at window limits the scan to the months it covers
+    result = await db.execute(
+        orders_with_history()
+        .where(Order.restaurant_id == restaurant_id, *created_window(Order.created_at, created_from, created_to))
+        .order_by(Order.created_at.desc(), Order.id.desc())
+    )
 
-    return orders
+    return result.scalars().all()
+
+
+# -------------------------------------------------------
+# GET /orders/restaurant/{id}/live → Live order queue (Server-Sent Events)
+# -------------------------------------------------------
+# Rendered as literals so the planner can match ix_orders_restaurant_active's predicate
+def is_active_order():
+    return Order.status.in_(bindparam("active_statuses", ACTIVE_ORDER_STATUSES, expanding=True, literal_execute=True))
+
+
+@router.get("/restaurant/{restaurant_id}/live", response_class=StreamingResponse)
+async def restaurant_order_feed(
+    restaurant_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(check_role("restaurant"))
+):
+    """
+    `snapshot` event with the restaurant's open orders, then an `order`
+    event ({"event": "created" | "status" | "assigned", "order":
+    OrderSummary}) for each new order, status change or driver assignment
+    (delivery_person_id set by dispatch). When the stream ends, reconnect:
+    the new stream starts from a fresh snapshot.
+    """
+    restaurant = (await db.execute(
+        select(Restaurant.id, Restaurant.owner_id).where(Restaurant.id == restaurant_id)
+    )).first()
+    if restaurant is None:
+        raise HTTPException(404, "Restaurant not found")
+    if not current_user.has_role("admin") and restaurant.owner_id != current_user.profile.id:
+        raise HTTPException(403, "Not your restaurant")
+
+    # Subscribe before reading the snapshot so nothing falls in between;
+    # an order can appear in both, so clients keep the highest version per order id.
+    queue = order_feed.subscribe(restaurant_id)
+    try:
+        # Primary, not a replica: a lagging replica could miss orders whose
+        # events were published before we subscribed
+        rows = (await db.execute(
+            select(*SUMMARY_COLUMNS)
+            .where(Order.restaurant_id == restaurant_id, is_active_order())
+            .order_by(Order.created_at, Order.id)
+        )).all()
+    except Exception:
+        order_feed.unsubscribe(restaurant_id, queue)
+        raise
+    finally:
+        # get_db is only torn down once the stream ends; hand the connection
+        # back now rather than hold it (and its transaction) for hours
+        await db.close()
+    snapshot = [OrderSummary.model_validate(row).model_dump(mode="json") for row in rows]
+
+    async def stream():
+        try:
+            yield sse_message("snapshot", snapshot)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), ORDER_FEED_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is END_OF_STREAM:
+                    break
+                yield sse_message("order", event)
+        finally:
+            order_feed.unsubscribe(restaurant_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # -------------------------------------------------------
 # GET /orders/delivery/{id} → Delivery partner orders
 # -------------------------------------------------------
 @router.get("/delivery/{delivery_id}", response_model=list[OrderResponse])
-def get_delivery_orders(
+async def get_delivery_orders(
     delivery_id: int,
-    db: Session = Depends(get_db),
+    created_from: Optional[datetime] = Query(None, description=f"Orders placed at or after this time (default {ORDER_LIST_DEFAULT_DAYS} days back)"),
+    created_to: Optional[datetime] = Query(None, description="Orders placed before this time"),
+    db: AsyncSession = Depends(get_read_db),
     _ = Depends(check_role("delivery"))
 ):
-    orders = db.query(Order).filter(
-        Order.delivery_person_id == delivery_id
-    ).all()
+    result = await db.execute(
+        orders_with_history()
+        .where(Order.delivery_person_id == delivery_id, *created_window(Order.created_at, created_from, created_to))
+        .order_by(Order.created_at.desc(), Order.id.desc())
+    )
 
-    return orders
+    return result.scalars().all()
 
 
 # -------------------------------------------------------
 # DELETE /orders/{id} → Admin delete
 # -------------------------------------------------------
 @router.delete("/{id}", status_code=204)
-def delete_order(
+async def delete_order(
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _ = Depends(check_role("admin"))
 ):
-    order = db.query(Order).filter(Order.id == id).first()
+    order = await load_order(db, id)
 
     if not order:
         raise HTTPException(404, "Order not found")
 
-    db.delete(order)
-    db.commit()
+    await db.delete(order)
+    await db.commit()
 
     return None
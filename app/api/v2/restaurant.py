@@ -1,97 +1,192 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from sqlalchemy import func, asc, desc
+from sqlalchemy import BigInteger, cast, func, select
+import os
 import uuid
-from app.schemas.restaurant import RestaurantCreate, Restaurant as RestaurantSchema , RestaurantUpdate
-from typing import List, Optional
+from app.schemas.restaurant import RestaurantCreate, Restaurant as RestaurantSchema , RestaurantUpdate, RestaurantSuggestion, SalesAnalytics
+from typing import List, Literal, Optional
+from datetime import date, timedelta
 from app.db.session import get_db
-from app.models.restaurant import Restaurant as RestaurantModel
+from app.db.replicas import get_read_db
+from app.models.restaurant import Restaurant as RestaurantModel, RestaurantSalesRollup, utcnow
 from app.models.user import Profile as ProfileModel
-from app.core.auth import get_current_user, check_role, add_role, check_any_role
+from app.core.auth import Principal, get_current_user, check_role, add_role, check_any_role
 from app.models.user import Profile
 from app.models.restaurant import MenuCategory 
 from app.schemas.menu import MenuCategoryResponse, MenuCategoryCreate
+from app.core.geo import haversine_km, within_bounding_box
+from app.core.http_cache import PRIVATE_CACHE_CONTROL, etag_matches, make_etag, not_modified, set_cache_headers
+from app.core.menu_cache import bump_menu_version
+from app.core.text_search import fuzzy_match, match_distance, use_similarity_threshold
+from app.core.pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, after_key, decode_cursor, encode_cursor
+from app.core.sales_rollup import COUNTERS
 
 router = APIRouter()
 
+# 🔹 Radius used for location search when the client doesn't pass max_distance_km
+DEFAULT_SEARCH_RADIUS_KM = float(os.getenv("RESTAURANT_SEARCH_RADIUS_KM", "25"))
+MAX_SEARCH_RADIUS_KM = float(os.getenv("RESTAURANT_SEARCH_MAX_RADIUS_KM", "200"))
+
+# 🔹 Sales analytics ranges
+ANALYTICS_DEFAULT_DAYS = int(os.getenv("ANALYTICS_DEFAULT_DAYS", "30"))
+ANALYTICS_MAX_HOURLY_DAYS = int(os.getenv("ANALYTICS_MAX_HOURLY_DAYS", "92"))  # caps the rows per response
+
 @router.get("/", response_model=List[RestaurantSchema], status_code=status.HTTP_200_OK)
-def search_restaurants(
-    name: Optional[str] = Query(None, description="Search restaurants by name"),
+async def search_restaurants(
+    response: Response,
+    name: Optional[str] = Query(None, min_length=1, max_length=100, description="Search restaurants by name (typo tolerant)"),
     min_rating: Optional[float] = Query(None, description="Minimum average rating"),
-    latitude: Optional[float] = Query(None, description="User latitude for location search"),
-    longitude: Optional[float] = Query(None, description="User longitude for location search"),
-    sort_by: Optional[str] = Query("name", enum=["name", "rating", "distance"]),
+    latitude: Optional[float] = Query(None, ge=-90, le=90, description="User latitude for location search"),
+    longitude: Optional[float] = Query(None, ge=-180, le=180, description="User longitude for location search"),
+    max_distance_km: Optional[float] = Query(None, gt=0, le=MAX_SEARCH_RADIUS_KM, description="Only restaurants within this radius (km) of latitude/longitude"),
+    sort_by: Optional[str] = Query(None, enum=["relevance", "name", "rating", "distance"], description="Defaults to relevance when searching by name, else name"),
     sort_order: Optional[str] = Query("asc", enum=["asc", "desc"]),
     page: int = Query(1, ge=1),
     size: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from the {NEXT_CURSOR_HEADER} header; replaces page"),
+    include_total: bool = Query(False, description=f"Return the number of matches in the {TOTAL_COUNT_HEADER} header"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     if not current_user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
 
     """
     🔎 Search restaurants by name, rating, and location.
-    Supports sorting by name, rating, or distance, with pagination.
+    Supports sorting by name relevance, name, rating, or distance, with cursor pagination.
     """
 
-    query = db.query(RestaurantModel)
+    query = select(RestaurantModel)
 
-    # 🧭 Filter by name
+    # 🧭 Filter by name: substring or close trigram match, served by ix_restaurants_name_trgm
+    relevance_column = None
     if name:
-        query = query.filter(RestaurantModel.name.ilike(f"%{name}%"))
+        await use_similarity_threshold(db)
+        relevance = match_distance(RestaurantModel.name, name)
+        relevance_column = relevance.label("relevance")
+        query = query.where(fuzzy_match(RestaurantModel.name, name)).add_columns(relevance_column)
 
     # ⭐ Filter by minimum rating
     if min_rating is not None:
-        query = query.filter(RestaurantModel.average_rating >= min_rating)
+        query = query.where(RestaurantModel.average_rating >= min_rating)
 
-    # 📍 Optional: distance calculation if lat/lon provided
+    # 📍 Location search: the bounding box narrows candidates via ix_restaurants_geo,
+    # then the exact haversine distance only runs on those rows
     distance_column = None
     if latitude is not None and longitude is not None:
-        # Haversine formula (distance in km)
-        distance_column = (
-            6371
-            * func.acos(
-                func.least(
-                    1.0,
-                    func.cos(func.radians(latitude))
-                    * func.cos(func.radians(RestaurantModel.latitude))
-                    * func.cos(func.radians(RestaurantModel.longitude) - func.radians(longitude))
-                    + func.sin(func.radians(latitude))
-                    * func.sin(func.radians(RestaurantModel.latitude))
-                )
-            )
-        ).label("distance_km")
+        radius_km = max_distance_km or DEFAULT_SEARCH_RADIUS_KM
+        distance = haversine_km(RestaurantModel.geo_lat, RestaurantModel.geo_lng, latitude, longitude)
+        distance_column = distance.label("distance_km")
 
-        query = query.add_columns(distance_column)
+        query = query.where(
+            within_bounding_box(RestaurantModel.geo_lat, RestaurantModel.geo_lng, latitude, longitude, radius_km),
+            distance <= radius_km,
+        ).add_columns(distance_column)
 
-    # 🧮 Sorting
-    if sort_by == "name":
-        order_col = RestaurantModel.name
+    # 🧮 Sorting (id breaks ties so the order is total and keyset-safe)
+    if sort_by is None:
+        sort_by = "relevance" if relevance_column is not None else "name"
+
+    if sort_by == "relevance" and relevance_column is not None:
+        order_col = relevance
     elif sort_by == "rating":
         order_col = RestaurantModel.average_rating
     elif sort_by == "distance" and distance_column is not None:
-        order_col = distance_column
+        order_col = distance
     else:
+        sort_by = "name"
         order_col = RestaurantModel.name
 
-    query = query.order_by(desc(order_col) if sort_order == "desc" else asc(order_col))
+    descending = sort_order == "desc"
+    sort_key = (order_col, RestaurantModel.id)
+    query = query.order_by(*(col.desc() if descending else col.asc() for col in sort_key))
+
+    # 🔢 Total only on request; it has to visit every match
+    if include_total:
+        total = await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+        response.headers[TOTAL_COUNT_HEADER] = str(total)
+
+    # 📊 Pagination: a cursor resumes after the last row seen (one index range scan);
+    # `page` is kept for older clients and still uses OFFSET
+    if cursor:
+        after = decode_cursor(cursor)
+        if after.get("sort") != [sort_by, sort_order] or not _valid_key(sort_by, after.get("after")):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor does not match this search")
+        query = query.where(after_key(sort_key, after["after"], descending))
+    elif page > 1:
+        query = query.offset((page - 1) * size)
+
+    # Fetch one extra row to learn whether there is a next page
+    result = await db.execute(query.limit(size + 1))
+    rows = result.all()
+
+    if len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        if sort_by == "relevance":
+            last_value = last.relevance
+        elif sort_by == "distance":
+            last_value = last.distance_km
+        elif sort_by == "rating":
+            last_value = last[0].average_rating
+        else:
+            last_value = last[0].name
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            {"sort": [sort_by, sort_order], "after": [last_value, last[0].id]}
+        )
+
+    # 💡 Rows may carry distance/relevance columns too; keep the Restaurant
+    return [row[0] for row in rows]
+
+
+_KEY_TYPES = {"relevance": (int, float), "name": (str,), "rating": (int,), "distance": (int, float)}
 
-    # 📊 Pagination
-    total = query.count()
-    restaurants = query.offset((page - 1) * size).limit(size).all()
 
-    # 💡 If you added distance_column, results are tuples: (Restaurant, distance)
-    if distance_column is not None:
-        restaurants = [r[0] for r in restaurants]
+def _valid_key(sort_by: str, after) -> bool:
+    return (
+        isinstance(after, list)
+        and len(after) == 2
+        and isinstance(after[0], _KEY_TYPES[sort_by])
+        and not isinstance(after[0], bool)
+        and isinstance(after[1], int)
+    )
+
 
-    return restaurants
+@router.get("/autocomplete", response_model=List[RestaurantSuggestion],
+            description="Suggest restaurants as the user types a name")
+async def autocomplete_restaurants(
+    q: str = Query(..., min_length=1, max_length=100, description="What the user has typed so far"),
+    limit: int = Query(8, ge=1, le=20),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    # Prefix matches first, then fuzzy ones, each by closeness to what was typed
+    await use_similarity_threshold(db)
+    is_prefix = RestaurantModel.name.istartswith(q, autoescape=True)
+    query = (
+        select(RestaurantModel.id, RestaurantModel.slug, RestaurantModel.name, RestaurantModel.logo_url)
+        .where(fuzzy_match(RestaurantModel.name, q))
+        .order_by(is_prefix.desc(), match_distance(RestaurantModel.name, q), RestaurantModel.name, RestaurantModel.id)
+        .limit(limit)
+    )
+    result = await db.execute(query)
+    return result.mappings().all()
 
 
 @router.get("/{restaurant_id}", response_model=RestaurantSchema)
-def get_restaurant(restaurant_id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
-    restaurant = db.query(RestaurantModel).filter(RestaurantModel.id == restaurant_id).first()
+async def get_restaurant(restaurant_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_read_db), current_user: Principal = Depends(get_current_user)):
+    # 🏷️ Conditional GET: answer If-None-Match from updated_at alone
+    updated_at = await db.scalar(select(RestaurantModel.updated_at).where(RestaurantModel.id == restaurant_id))
+    if updated_at is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Restaurant not found")
+
+    etag = make_etag("restaurant", restaurant_id, updated_at.timestamp())
+    if etag_matches(request, etag):
+        return not_modified(etag, PRIVATE_CACHE_CONTROL)
+    set_cache_headers(response, etag, PRIVATE_CACHE_CONTROL)
+
+    restaurant = await db.get(RestaurantModel, restaurant_id)
     if not restaurant:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Restaurant not found")
     return restaurant
@@ -103,15 +198,15 @@ def get_restaurant(restaurant_id: int, db: Session = Depends(get_db), current_us
     status_code=status.HTTP_201_CREATED,
     description="Create a restaurant for another user (admin only)"
 )
-def create_restaurant_for_user(
+async def create_restaurant_for_user(
     restaurant: RestaurantCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _ = Depends(check_role("admin"))
 ):
     # -------------------------
     # 2. Validate owner existence
     # -------------------------
-    owner = db.query(ProfileModel).filter(ProfileModel.id == restaurant.owner_id).first()
+    owner = await db.get(ProfileModel, restaurant.owner_id)
     if not owner:
         raise HTTPException(
             status_code=404,
@@ -154,7 +249,7 @@ def create_restaurant_for_user(
     # 5. Add manager role safely
     # -------------------------
     try:
-        add_role(db, restaurant.owner_id, "manager")
+        await add_role(db, restaurant.owner_id, "manager")
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -166,12 +261,12 @@ def create_restaurant_for_user(
     # -------------------------
     try:
         db.add(db_restaurant)
-        db.commit()
-        db.refresh(db_restaurant)
+        await db.commit()
+        await db.refresh(db_restaurant)
         return db_restaurant
 
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
 
         # Unique constraint errors
         if 'slug' in str(e.orig):
@@ -191,83 +286,81 @@ def create_restaurant_for_user(
         )
 
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Database error: {str(e)}"
         )
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Unexpected server error: {str(e)}"
         )
 
 @router.put("/{restaurant_id}/", response_model=RestaurantSchema, description="Update restaurant info (admin only)")
-def update_restaurant_info(
+async def update_restaurant_info(
     restaurant_id: int,
     restaurant_update: RestaurantCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _ = Depends(check_role("admin"))
 ):
-    db_restaurant = db.query(RestaurantModel).filter(RestaurantModel.id == restaurant_id).first()
+    db_restaurant = await db.get(RestaurantModel, restaurant_id)
     if not db_restaurant:
         raise HTTPException(status_code=404, detail="Restaurant not found")
     
     for key, value in restaurant_update.dict().items():
         setattr(db_restaurant, key, value)
     
-    db.commit()
-    db.refresh(db_restaurant)
+    await db.commit()
+    await db.refresh(db_restaurant)
     return db_restaurant
 
 
 @router.patch("/{restaurant_id}/", response_model=RestaurantSchema, description="Patch restaurant info (admin only)")
-def patch_restaurant_info(
+async def patch_restaurant_info(
     restaurant_id: int,
     restaurant_update: RestaurantUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _ = Depends(check_role("admin"))
 ):
-    db_restaurant = db.query(RestaurantModel).filter(RestaurantModel.id == restaurant_id).first()
+    db_restaurant = await db.get(RestaurantModel, restaurant_id)
     if not db_restaurant:
         raise HTTPException(status_code=404, detail="Restaurant not found")
     
     for key, value in restaurant_update.dict(exclude_unset=True).items():
         setattr(db_restaurant, key, value)
     
-    db.commit()
-    db.refresh(db_restaurant)
+    await db.commit()
+    await db.refresh(db_restaurant)
     return db_restaurant
 
 
 @router.delete("/{restaurant_id}/", status_code=status.HTTP_204_NO_CONTENT, description="Delete restaurant (admin only)")
-def delete_restaurant(
+async def delete_restaurant(
     restaurant_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _ = Depends(check_role("admin"))
 ):
-    db_restaurant = db.query(RestaurantModel).filter(RestaurantModel.id == restaurant_id).first()
+    db_restaurant = await db.get(RestaurantModel, restaurant_id)
     if not db_restaurant:
         raise HTTPException(status_code=404, detail="Restaurant not found")
     
-    db.delete(db_restaurant)
-    db.commit()
+    await db.delete(db_restaurant)
+    await db.commit()
     return None
 
 
 @router.get("/{restaurant_id}/categories", response_model=list[MenuCategoryResponse])
-def get_categories_for_restaurant(
+async def get_categories_for_restaurant(
     restaurant_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    categories = (
-        db.query(MenuCategory)
-        .filter(MenuCategory.restaurant_id == restaurant_id)
-        .all()
+    result = await db.execute(
+        select(MenuCategory).where(MenuCategory.restaurant_id == restaurant_id)
     )
-    return categories
+    return result.scalars().all()
 
 
 @router.post(
@@ -275,10 +368,10 @@ def get_categories_for_restaurant(
     response_model=MenuCategoryResponse,
     status_code=201
 )
-def create_category_for_restaurant(
+async def create_category_for_restaurant(
     restaurant_id: int,
     payload: MenuCategoryCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _ = Depends(check_any_role(["manager", "admin"]))
 ):
 
@@ -287,26 +380,97 @@ def create_category_for_restaurant(
         **payload.dict()               # name + description only
     )
     db.add(new_category)
-    db.commit()
-    db.refresh(new_category)
+    await bump_menu_version(db, restaurant_id)
+    await db.commit()
+    await db.refresh(new_category)
     return new_category
 
 #get my restaurants for manager
 @router.get("/my-restaurants/", response_model=List[RestaurantSchema],
             description="Get restaurants for the logged-in manager")
-def get_my_restaurants(
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user),
+async def get_my_restaurants(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
     _ = Depends(check_role("manager"))
 ):
-    profile = db.query(Profile).filter(Profile.firebase_uid == current_user["user_id"]).first()
-    if not profile:
-        raise HTTPException(status_code=404, detail="User profile not found")
-    
-    restaurants = (
-        db.query(RestaurantModel)
-        .filter(RestaurantModel.owner_id == profile.id)
-        .all()
+    result = await db.execute(
+        select(RestaurantModel).where(RestaurantModel.owner_id == current_user.profile.id)
     )
 
-    return restaurants
\ No newline at end of file
+    return result.scalars().all()
+
+
+def sales_bucket(counts, day=None, hour=None) -> dict:
+    orders = counts["orders_placed"] - counts["orders_cancelled"]
+    revenue = counts["gross_amount"] - counts["cancelled_amount"]
+    return {
+        "day": day,
+        "hour": hour,
+        "orders": orders,
+        "revenue": revenue,
+        "average_ticket": round(revenue / orders, 2) if orders else 0.0,
+        "items_sold": counts["items_sold"],
+        "cancelled_orders": counts["orders_cancelled"],
+        "delivered_orders": counts["orders_delivered"],
+        "delivered_revenue": counts["delivered_amount"],
+    }
+
+
+# -------------------------------------------------------
+# GET /restaurants/{id}/analytics → Sales by day or hour (owner or admin)
+# -------------------------------------------------------
+@router.get("/{restaurant_id}/analytics", response_model=SalesAnalytics,
+            description="Revenue, order count and average ticket by day or hour (UTC), from the hourly rollups")
+async def get_restaurant_analytics(
+    restaurant_id: int,
+    date_from: Optional[date] = Query(None, description=f"First day, inclusive (default {ANALYTICS_DEFAULT_DAYS} days back)"),
+    date_to: Optional[date] = Query(None, description="Last day, inclusive (default today)"),
+    granularity: Literal["day", "hour"] = Query("day"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(check_any_role(["manager", "admin"]))
+):
+    restaurant = (await db.execute(
+        select(RestaurantModel.id, RestaurantModel.owner_id).where(RestaurantModel.id == restaurant_id)
+    )).first()
+    if restaurant is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Restaurant not found")
+    if not current_user.has_role("admin") and restaurant.owner_id != current_user.profile.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your restaurant")
+
+    date_to = date_to or utcnow().date()
+    date_from = date_from or date_to - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+    if date_from > date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from must not be after date_to")
+    if granularity == "hour" and (date_to - date_from).days >= ANALYTICS_MAX_HOURLY_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Hourly analytics cover at most {ANALYTICS_MAX_HOURLY_DAYS} days",
+        )
+
+    # 📊 One range scan of the rollup primary key (restaurant_id, day, hour);
+    # at most 24 rows per day whatever the order volume
+    keys = [RestaurantSalesRollup.day]
+    if granularity == "hour":
+        keys.append(RestaurantSalesRollup.hour)
+    rows = (await db.execute(
+        select(*keys, *(cast(func.sum(getattr(RestaurantSalesRollup, name)), BigInteger).label(name) for name in COUNTERS))
+        .where(
+            RestaurantSalesRollup.restaurant_id == restaurant_id,
+            RestaurantSalesRollup.day.between(date_from, date_to),
+        )
+        .group_by(*keys)
+        .order_by(*keys)
+    )).all()
+
+    totals = {name: sum(getattr(row, name) for row in rows) for name in COUNTERS}
+    return {
+        "restaurant_id": restaurant_id,
+        "date_from": date_from,
+        "date_to": date_to,
+        "granularity": granularity,
+        "totals": sales_bucket(totals),
+        "buckets": [
+            sales_bucket(row._mapping, row.day, row.hour if granularity == "hour" else None)
+            for row in rows
+        ],
+    }
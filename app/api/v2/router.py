@@ -1,6 +1,6 @@
 from fastapi import FastAPI
 from app.api.v2 import (
-    address,menu,restaurant,users,userAuth,cart,order
+    address,menu,restaurant,users,userAuth,cart,order,delivery,metrics
 )
 
 app = FastAPI(
@@ -16,4 +16,5 @@ app.include_router(address.router, prefix="/addresses", tags=["Addresses"])
 app.include_router(menu.router, prefix="/menu", tags=["Menu"])
 app.include_router(cart.router, prefix="/cart", tags=["Cart"])
 app.include_router(order.router, prefix="/orders", tags=["Orders"])
-
+app.include_router(delivery.router, prefix="/delivery", tags=["Delivery"])
+app.include_router(metrics.router, prefix="/metrics", tags=["Metrics"])
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from app.db.session import get_db
 from app.models.user import Profile as ProfileModel
 from app.schemas.user import User
-from app.core.auth import get_current_user, create_session_cookie, logout_user
+from app.core.auth import Principal, get_current_user, create_session_cookie, logout_user
+from app.core.profile_cache import notify_profile_changed
 from firebase_admin import auth
 import datetime
 from app.schemas.auth import SessionLoginRequest
@@ -13,16 +16,16 @@ router = APIRouter()
 
 # 🔹 Create session cookie and ensure user exists in DB
 @router.post("/session-login", description="Exchange Firebase ID token for a secure session cookie")
-def session_login(
+async def session_login(
     data: SessionLoginRequest,  # 👈 The body will contain { "idToken": "..." }
     response: Response,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     id_token = data.idToken  # Extract from JSON body
 
     # 🔹 Verify ID token from Firebase
     try:
-        decoded_token = auth.verify_id_token(id_token)
+        decoded_token = await run_in_threadpool(auth.verify_id_token, id_token)
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Invalid Firebase ID token: {e}")
 
@@ -37,7 +40,8 @@ def session_login(
         raise HTTPException(status_code=400, detail="Invalid Firebase token payload")
 
     # 🔹 Check or create user in local DB
-    db_user = db.query(ProfileModel).filter(ProfileModel.firebase_uid == firebase_uid).first()
+    result = await db.execute(select(ProfileModel).where(ProfileModel.firebase_uid == firebase_uid))
+    db_user = result.scalars().first()
 
     if not db_user:
         db_user = ProfileModel(
@@ -48,8 +52,7 @@ def session_login(
             phone_number=phone
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
     else:
         # Optional: update existing info if changed in Firebase
         updated = False
@@ -63,11 +66,11 @@ def session_login(
             db_user.phone_number = phone
             updated = True
         if updated:
-            db.commit()
-            db.refresh(db_user)
+            await notify_profile_changed(db, firebase_uid)
+            await db.commit()
 
     # 🔹 Create long-lived session cookie (2 weeks)
-    session_cookie = create_session_cookie(id_token)
+    session_cookie = await create_session_cookie(id_token)
     expires_in = datetime.timedelta(days=14)
     # 🔹 Set cookie on response
     response.set_cookie(
@@ -88,13 +91,12 @@ def session_login(
 
 # 🔹 Logout
 @router.post("/logout")
-def logout(response: Response, current_user=Depends(get_current_user)):
-    logout_user(current_user["user_id"])
+async def logout(response: Response, current_user: Principal = Depends(get_current_user)):
+    await logout_user(current_user.user_id)
     response.delete_cookie("session")
     return {"message": "Logged out"}
 
 # 🔹 Protected route example
 @router.get("/me", response_model=User)
-def get_profile(current_user=Depends(get_current_user)):
-    db_user = current_user["db_user"]
-    return db_user
+async def get_profile(current_user: Principal = Depends(get_current_user)):
+    return current_user.profile
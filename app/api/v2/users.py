@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
+from app.db.replicas import get_read_db
 from app.models.user import Profile as ProfileModel
 from app.schemas.user import UserCreate, User, UserUpdate
-from app.core.auth import get_current_user, check_role, check_any_role
+from app.core.auth import Principal, get_current_user, check_role, check_any_role
+from app.core.profile_cache import notify_profile_changed
 
 router = APIRouter()
 
@@ -12,23 +15,24 @@ def AdminOnly():
     return check_role("admin")
 
 
+# The principal carries a cached snapshot; writes need the live row (PK lookup)
+async def get_my_profile_row(db: AsyncSession, current_user: Principal):
+    db_user = await db.get(ProfileModel, current_user.profile.id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return db_user
+
+
 # ────────────────────────────────────────────────────────────────
 # ✔ Logged-in user → get own profile
 # ────────────────────────────────────────────────────────────────
 
 @router.get("/me", response_model=User)
-def read_my_user(
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+async def read_my_user(
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    db_user = db.query(ProfileModel).filter(
-        ProfileModel.firebase_uid == current_user["user_id"]
-    ).first()
-
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    return db_user
+    return current_user.profile
 
 
 # ────────────────────────────────────────────────────────────────
@@ -36,24 +40,20 @@ def read_my_user(
 # ────────────────────────────────────────────────────────────────
 
 @router.patch("/me", response_model=User)
-def update_my_user(
+async def update_my_user(
     user: UserUpdate,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    db_user = db.query(ProfileModel).filter(
-        ProfileModel.firebase_uid == current_user["user_id"]
-    ).first()
-
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+    db_user = await get_my_profile_row(db, current_user)
 
     update_data = user.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_user, key, value)
 
-    db.commit()
-    db.refresh(db_user)
+    await notify_profile_changed(db, db_user.firebase_uid)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
@@ -62,24 +62,20 @@ def update_my_user(
 # ────────────────────────────────────────────────────────────────
 
 @router.put("/me", response_model=User)
-def replace_my_user(
+async def replace_my_user(
     user: UserCreate,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    db_user = db.query(ProfileModel).filter(
-        ProfileModel.firebase_uid == current_user["user_id"]
-    ).first()
-
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+    db_user = await get_my_profile_row(db, current_user)
 
     db_user.full_name = user.full_name
     db_user.phone_number = user.phone_number
     db_user.profile_picture_url = user.profile_picture_url
 
-    db.commit()
-    db.refresh(db_user)
+    await notify_profile_changed(db, db_user.firebase_uid)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
@@ -88,22 +84,18 @@ def replace_my_user(
 # ────────────────────────────────────────────────────────────────
 
 @router.patch("/me/profile-picture", response_model=User)
-def update_profile_picture(
+async def update_profile_picture(
     profile_picture_url: str,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    db_user = db.query(ProfileModel).filter(
-        ProfileModel.firebase_uid == current_user["user_id"]
-    ).first()
-
-    if db_user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+    db_user = await get_my_profile_row(db, current_user)
 
     db_user.profile_picture_url = profile_picture_url
 
-    db.commit()
-    db.refresh(db_user)
+    await notify_profile_changed(db, db_user.firebase_uid)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
@@ -112,15 +104,15 @@ def update_profile_picture(
 # ────────────────────────────────────────────────────────────────
 
 @router.get("/search/", response_model=list[User], description="Search users by email (admin only)")
-def search_users_by_email(
+async def search_users_by_email(
     email: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     _ = Depends(AdminOnly())
 ):
-    users = db.query(ProfileModel).filter(
-        ProfileModel.email.ilike(f"%{email}%")
-    ).all()
-    return users
+    result = await db.execute(
+        select(ProfileModel).where(ProfileModel.email.ilike(f"%{email}%"))
+    )
+    return result.scalars().all()
 
 
 # ────────────────────────────────────────────────────────────────
@@ -128,18 +120,19 @@ def search_users_by_email(
 # ────────────────────────────────────────────────────────────────
 
 @router.delete("/{user_id}/", status_code=status.HTTP_204_NO_CONTENT, description="Delete user by ID (admin only)")
-def delete_user(
+async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _ = Depends(AdminOnly())
 ):
-    db_user = db.query(ProfileModel).filter(ProfileModel.id == user_id).first()
+    db_user = await db.get(ProfileModel, user_id)
 
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    db.delete(db_user)
-    db.commit()
+    await notify_profile_changed(db, db_user.firebase_uid)
+    await db.delete(db_user)
+    await db.commit()
     return None
 
 
@@ -148,12 +141,12 @@ def delete_user(
 # ────────────────────────────────────────────────────────────────
 
 @router.get("/{user_id}/", response_model=User, description="Get user by ID (admin only)")
-def get_user_by_id(
+async def get_user_by_id(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     _ = Depends(AdminOnly())
 ):
-    db_user = db.query(ProfileModel).filter(ProfileModel.id == user_id).first()
+    db_user = await db.get(ProfileModel, user_id)
 
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -166,11 +159,13 @@ def get_user_by_id(
 # ────────────────────────────────────────────────────────────────
 
 @router.get("/", response_model=list[User], description="Get all users (admin only)")
-def get_all_users(
+async def get_all_users(
     skip: int = 0,
     limit: int = 10,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     _ = Depends(AdminOnly())
 ):
-    users = db.query(ProfileModel).offset(skip).limit(limit).all()
-    return users
+    result = await db.execute(
+        select(ProfileModel).order_by(ProfileModel.id).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
@@ -2,28 +2,65 @@
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from firebase_admin import auth
-from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import ARRAY
 from app.db.session import get_db
 from app.models.user import Profile as ProfileModel
-from sqlalchemy import update, func
+from sqlalchemy import update, func, select, literal, String
 from app.models.user import Profile as User
+from app.core.session_cache import session_cache
+from app.core.revocation import revocation_watermarks
+from app.core.profile_cache import ProfileSnapshot, profile_cache, notify_profile_changed
+from dataclasses import dataclass, field
 import datetime
 
 
 security = HTTPBearer()
 
 
+# 🔹 The authenticated caller, resolved once per request
+@dataclass
+class Principal:
+    user_id: str                      # Firebase uid
+    email: str
+    profile: ProfileSnapshot
+    claims: dict = field(default_factory=dict, repr=False)
+
+    @property
+    def roles(self) -> tuple:
+        return self.profile.roles
+
+    def has_role(self, role: str) -> bool:
+        return role in self.roles
+
+    def has_any_role(self, roles: list[str]) -> bool:
+        return any(role in self.roles for role in roles)
+
+
 
 # 🔹 Verify Firebase session cookie
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)) -> Principal:
+    # FastAPI already caches this dependency per request; request.state covers
+    # callers that resolve it outside the dependency graph.
+    principal = getattr(request.state, "principal", None)
+    if principal is not None:
+        return principal
+
     session_cookie = request.cookies.get("session")
     if not session_cookie:
         raise HTTPException(status_code=401, detail="Session cookie missing")
 
-    try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
-    except auth.InvalidSessionCookieError:
-        raise HTTPException(status_code=401, detail="Invalid or expired session cookie")
+    # Serve recently verified cookies from memory, skipping signature checks.
+    # Revocation is checked offline against local watermarks (app/core/revocation.py).
+    # Firebase Admin is blocking, so cache misses go through the threadpool.
+    decoded_claims = session_cache.get(session_cookie)
+    if decoded_claims is None:
+        try:
+            decoded_claims = await run_in_threadpool(auth.verify_session_cookie, session_cookie, check_revoked=False)
+        except auth.InvalidSessionCookieError:
+            raise HTTPException(status_code=401, detail="Invalid or expired session cookie")
+        session_cache.put(session_cookie, decoded_claims)
 
     # Check if user exists in DB
     firebase_uid = decoded_claims.get("uid")
@@ -31,27 +68,53 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
     if not firebase_uid or not email:
         raise HTTPException(status_code=401, detail="Invalid Firebase payload")
 
-    db_user = db.query(ProfileModel).filter(ProfileModel.firebase_uid == firebase_uid).first()
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
+    auth_time = decoded_claims.get("auth_time", 0)
+    revoked = revocation_watermarks.cached_verdict(firebase_uid, auth_time)
+    if revoked is None:
+        try:
+            revoked = await run_in_threadpool(revocation_watermarks.is_revoked, firebase_uid, auth_time)
+        except Exception:
+            raise HTTPException(status_code=503, detail="Unable to verify session revocation")
+    if revoked:
+        session_cache.invalidate_cookie(session_cookie)
+        raise HTTPException(status_code=401, detail="Session revoked")
+
+    profile = profile_cache.get(firebase_uid)
+    if profile is None:
+        generation = profile_cache.generation
+        result = await db.execute(select(ProfileModel).where(ProfileModel.firebase_uid == firebase_uid))
+        db_user = result.scalars().first()
+        if not db_user:
+            raise HTTPException(status_code=404, detail="User not found")
+        profile = ProfileSnapshot.from_model(db_user)
+        profile_cache.put(profile, generation)
 
-    return {"user_id": firebase_uid, "email": email, "db_user": db_user}
+    principal = Principal(user_id=firebase_uid, email=email, profile=profile, claims=decoded_claims)
+    request.state.principal = principal
+    return principal
 
 # 🔹 Create a Firebase session cookie
-def create_session_cookie(id_token: str):
+async def create_session_cookie(id_token: str):
     try:
         expires_in = datetime.timedelta(days=14)  # max 2 weeks
-        session_cookie = auth.create_session_cookie(id_token, expires_in=expires_in)
+        session_cookie = await run_in_threadpool(auth.create_session_cookie, id_token, expires_in=expires_in)
         return session_cookie
     except Exception:
         raise HTTPException(status_code=401, detail="Failed to create session cookie")
 
 # 🔹 Logout + revoke tokens
-def logout_user(firebase_uid: str):
+async def logout_user(firebase_uid: str):
     try:
-        auth.revoke_refresh_tokens(firebase_uid)
+        await run_in_threadpool(auth.revoke_refresh_tokens, firebase_uid)
     except Exception:
         raise HTTPException(status_code=500, detail="Failed to revoke Firebase tokens")
+    session_cache.invalidate_user(firebase_uid)
+    # Take the watermark Firebase stored rather than the local clock, which may be skewed
+    try:
+        await run_in_threadpool(revocation_watermarks.reload, firebase_uid)
+    except Exception:
+        # Tokens are revoked; drop the stale entry so the next check asks Firebase
+        revocation_watermarks.forget(firebase_uid)
     
 
 '''def verify_firebase_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -72,50 +135,32 @@ def get_current_user(decoded_token: dict = Depends(verify_firebase_token)):
 
 
 def check_role(role: str):
-    def role_checker(
-        current_user: dict = Depends(get_current_user),
-        db: Session = Depends(get_db)
-    ):
-        user_id = current_user.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid user")
-
-        db_user = db.query(ProfileModel).filter(ProfileModel.firebase_uid == user_id).first()
-        if not db_user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        if not db_user.roles or role not in db_user.roles:
+    async def role_checker(current_user: Principal = Depends(get_current_user)):
+        if not current_user.has_role(role):
             raise HTTPException(status_code=403, detail=f"Not authorized as {role}")
 
-        return True
+        return current_user
     return role_checker
 
 
 #function to check if any of the role is in user
 def check_any_role(roles: list[str]):
-    def role_checker(
-        current_user: dict = Depends(get_current_user),
-        db: Session = Depends(get_db)
-    ):
-        user_id = current_user.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid user")
-
-        db_user = db.query(ProfileModel).filter(ProfileModel.firebase_uid == user_id).first()
-        if not db_user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        if not db_user.roles or not any(role in db_user.roles for role in roles):
+    async def role_checker(current_user: Principal = Depends(get_current_user)):
+        if not current_user.has_any_role(roles):
             raise HTTPException(status_code=403, detail=f"Not authorized with required roles")
 
-        return True
+        return current_user
     return role_checker
 
-def add_role(db, user_id: int, role: str):
+async def add_role(db: AsyncSession, user_id: int, role: str):
+    # asyncpg binds with explicit casts, so the empty-array fallback must be typed
+    empty_roles = literal([], ARRAY(String))
     stmt = (
         update(User)
         .where(User.id == user_id)
-        .values(roles=func.array_append(func.coalesce(User.roles, '{}'), role))
+        .values(roles=func.array_append(func.coalesce(User.roles, empty_roles), role))
+        .returning(User.firebase_uid)
     )
-    db.execute(stmt)
-    db.commit()
\ No newline at end of file
+    firebase_uid = (await db.execute(stmt)).scalar()
+    await notify_profile_changed(db, firebase_uid)
+    await db.commit()
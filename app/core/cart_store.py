@@ -0,0 +1,642 @@
+# app/core/cart_store.py
+import asyncio
+import itertools
+import logging
+import os
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, Integer, String, delete, func, literal, select, true, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import selectinload
+
+from app.db.session import AsyncSessionLocal
+from app.models.restaurant import Cart, CartItem, MenuItem, utcnow
+
+
+logger = logging.getLogger(__name__)
+
+# 🔹 Backend selection
+# CART_STORE:        postgres (every change committed) | memory (write-behind)
+# CART_FLUSH_MODE:   memory backend only; what a worker crash can lose
+#   write_through  → nothing: each change is persisted before it is applied
+#   interval       → up to CART_FLUSH_INTERVAL seconds of changes
+#   checkout       → everything since the last checkout (or clean shutdown)
+# The memory backend keeps carts per worker, so it needs a single worker or
+# sticky sessions.
+CART_STORE = os.getenv("CART_STORE", "postgres")
+CART_FLUSH_MODE = os.getenv("CART_FLUSH_MODE", "interval")
+CART_FLUSH_INTERVAL = float(os.getenv("CART_FLUSH_INTERVAL", "5"))
+CART_STORE_MAXSIZE = int(os.getenv("CART_STORE_MAXSIZE", "50000"))
+
+FLUSH_MODES = ("write_through", "interval", "checkout")
+
+
+# ─────────────────────────────────────────────
+# Single-round-trip SQL writes (shared by both backends)
+# ─────────────────────────────────────────────
+# Every mutation is two statements in one transaction: the item write, whose
+# first step locks the user's cart row (so concurrent writes to one cart
+# serialize), then refresh_cart_totals. Postgres only allows data-modifying
+# CTEs at the top level, hence add_cte().
+
+def locked_cart_cte(user_id):
+    return select(Cart.id).where(Cart.user_id == user_id).with_for_update().cte("cart")
+
+
+def upsert_cart_statement(user_id):
+    # Creates the cart on first use; DO UPDATE (not NOTHING) so the row is locked and returned
+    now = utcnow()
+    stmt = pg_insert(Cart).values(user_id=user_id, total_amount=0, total_items=0, created_at=now, updated_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Cart.user_id],
+        set_={"updated_at": stmt.excluded.updated_at},
+    )
+    return stmt.returning(Cart.id)
+
+
+def upsert_cart_cte(user_id):
+    return upsert_cart_statement(user_id).cte("cart")
+
+
+def add_item_statement(user_id, menu_item_id, restaurant_id, quantity, notes=None):
+    """
+    INSERT ... SELECT FROM menu_items ON CONFLICT unique_cart_item DO UPDATE.
+    Prices come from the menu row; an existing line has its quantity increased.
+    Returns no row when the menu item doesn't exist in that restaurant.
+    """
+    cart = upsert_cart_cte(user_id)
+    source = select(
+        cart.c.id,
+        MenuItem.id,
+        MenuItem.restaurant_id,
+        literal(quantity, Integer),
+        MenuItem.price,
+        MenuItem.price * quantity,
+        literal(notes, String),
+        literal(utcnow(), DateTime),
+    ).select_from(
+        cart.join(MenuItem, true())  # the CTE is a single row
+    ).where(MenuItem.id == menu_item_id, MenuItem.restaurant_id == restaurant_id)
+
+    stmt = pg_insert(CartItem).from_select(
+        ["cart_id", "menu_item_id", "restaurant_id", "quantity",
+         "price_per_item", "total_price", "notes", "created_at"],
+        source,
+    )
+    new_quantity = CartItem.quantity + stmt.excluded.quantity
+    stmt = stmt.on_conflict_do_update(
+        constraint="unique_cart_item",
+        set_={
+            "quantity": new_quantity,
+            "total_price": new_quantity * CartItem.price_per_item,
+            "notes": func.coalesce(stmt.excluded.notes, CartItem.notes),
+        },
+    )
+    return stmt.returning(CartItem).add_cte(cart)
+
+
+def set_quantity_statement(user_id, item_id, quantity):
+    cart = locked_cart_cte(user_id)
+    return (
+        update(CartItem)
+        .where(CartItem.id == item_id, CartItem.cart_id == cart.c.id)
+        .values(quantity=quantity, total_price=CartItem.price_per_item * quantity)
+        .returning(CartItem)
+        .add_cte(cart)
+    )
+
+
+def remove_item_statement(user_id, item_id):
+    cart = locked_cart_cte(user_id)
+    return (
+        delete(CartItem)
+        .where(CartItem.id == item_id, CartItem.cart_id == cart.c.id)
+        .returning(CartItem.cart_id)
+        .add_cte(cart)
+    )
+
+
+async def run_item_write(db, stmt):
+    # populate_existing: the returned row must win over any copy already in the session
+    result = await db.execute(
+        stmt, execution_options={"synchronize_session": False, "populate_existing": True}
+    )
+    return result.scalars().first()
+
+
+async def refresh_cart_totals(db, cart_id):
+    # Recomputed from the cart's own lines (index on cart_id), so totals can't drift
+    lines = select(CartItem.quantity, CartItem.total_price).where(CartItem.cart_id == cart_id).subquery()
+    await db.execute(
+        update(Cart)
+        .where(Cart.id == cart_id)
+        .values(
+            total_items=select(func.coalesce(func.sum(lines.c.quantity), 0)).scalar_subquery(),
+            # total_amount is an INTEGER column while line totals are floats
+            total_amount=select(func.round(func.coalesce(func.sum(lines.c.total_price), 0))).scalar_subquery(),
+            updated_at=utcnow(),
+        ),
+        execution_options={"synchronize_session": False},
+    )
+
+
+async def load_cart(db, user_id, populate_existing=False):
+    # Items are always eager-loaded: CartResponse reads them, and AsyncSession
+    # cannot lazy-load.
+    result = await db.execute(
+        select(Cart).options(selectinload(Cart.items)).where(Cart.user_id == user_id),
+        execution_options={"populate_existing": populate_existing},
+    )
+    return result.scalars().first()
+
+
+async def get_or_create_cart(db, user_id):
+    cart = await load_cart(db, user_id)
+    if not cart:
+        # carts.user_id is unique, so a concurrent first request can't create a second cart
+        now = utcnow()
+        await db.execute(
+            pg_insert(Cart)
+            .values(user_id=user_id, total_amount=0, total_items=0, created_at=now, updated_at=now)
+            .on_conflict_do_nothing(index_elements=[Cart.user_id])
+        )
+        await db.commit()
+        cart = await load_cart(db, user_id)
+    return cart
+
+
+def _not_found(detail, index=None):
+    if index is not None:
+        detail = f"Operation {index}: {detail}"
+    return HTTPException(404, detail)
+
+
+# ─────────────────────────────────────────────
+# Store interface
+# ─────────────────────────────────────────────
+class CartStore(ABC):
+    """
+    Where carts live between requests. Methods return objects readable as
+    CartResponse / CartItemResponse and raise HTTPException on bad input.
+    Quantities are validated by the caller.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def get_cart(self, db, user_id):
+        ...
+
+    @abstractmethod
+    async def add_item(self, db, user_id, menu_item_id, restaurant_id, quantity, notes=None):
+        ...
+
+    @abstractmethod
+    async def set_quantity(self, db, user_id, item_id, quantity):
+        ...
+
+    @abstractmethod
+    async def remove_item(self, db, user_id, item_id):
+        ...
+
+    @abstractmethod
+    async def clear(self, db, user_id):
+        ...
+
+    @abstractmethod
+    async def apply_batch(self, db, user_id, operations):
+        ...
+
+    async def flush(self, db, user_id):
+        """Make the user's cart durable in carts/cart_items."""
+
+    @asynccontextmanager
+    async def checkout(self, db, user_id):
+        """
+        Wrap code that turns carts/cart_items into an order: the cart is
+        durable on entry and is not changed by this store until exit.
+        """
+        await self.flush(db, user_id)
+        yield
+
+    def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+# ─────────────────────────────────────────────
+# Postgres backend — every change committed
+# ─────────────────────────────────────────────
+class PostgresCartStore(CartStore):
+    name = "postgres"
+
+    async def get_cart(self, db, user_id):
+        return await get_or_create_cart(db, user_id)
+
+    async def add_item(self, db, user_id, menu_item_id, restaurant_id, quantity, notes=None):
+        cart_item = await run_item_write(db, add_item_statement(user_id, menu_item_id, restaurant_id, quantity, notes))
+        if not cart_item:
+            await db.rollback()
+            raise _not_found("Menu item not found")
+        await refresh_cart_totals(db, cart_item.cart_id)
+        await db.commit()
+        return cart_item
+
+    async def set_quantity(self, db, user_id, item_id, quantity):
+        cart_item = await run_item_write(db, set_quantity_statement(user_id, item_id, quantity))
+        if not cart_item:
+            await db.rollback()
+            raise _not_found("Item not found in your cart")
+        await refresh_cart_totals(db, cart_item.cart_id)
+        await db.commit()
+        return cart_item
+
+    async def remove_item(self, db, user_id, item_id):
+        cart_id = await run_item_write(db, remove_item_statement(user_id, item_id))
+        if cart_id is None:
+            await db.rollback()
+            raise _not_found("Item not found")
+        await refresh_cart_totals(db, cart_id)
+        await db.commit()
+
+    async def clear(self, db, user_id):
+        # Zeroing the totals locks the cart row before its lines go
+        result = await db.execute(
+            update(Cart)
+            .where(Cart.user_id == user_id)
+            .values(total_amount=0, total_items=0, updated_at=utcnow())
+            .returning(Cart.id),
+            execution_options={"synchronize_session": False},
+        )
+        cart_id = result.scalar()
+        if cart_id is None:
+            raise _not_found("Cart not found")
+        await db.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+        await db.commit()
+
+    async def apply_batch(self, db, user_id, operations):
+        try:
+            # Create/lock the cart once; later statements find the lock already held
+            cart_id = (await db.execute(upsert_cart_statement(user_id))).scalar_one()
+
+            for index, op in enumerate(operations):
+                if op.op == "add":
+                    written = await run_item_write(db, add_item_statement(
+                        user_id, op.menu_item_id, op.restaurant_id, op.quantity, op.notes
+                    ))
+                    if not written:
+                        raise _not_found("Menu item not found", index)
+                elif op.op == "update":
+                    if not await run_item_write(db, set_quantity_statement(user_id, op.item_id, op.quantity)):
+                        raise _not_found("Item not found in your cart", index)
+                elif op.op == "remove":
+                    if await run_item_write(db, remove_item_statement(user_id, op.item_id)) is None:
+                        raise _not_found("Item not found in your cart", index)
+                else:  # clear
+                    await db.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+
+            await refresh_cart_totals(db, cart_id)
+            await db.commit()
+
+        except HTTPException:
+            await db.rollback()
+            raise
+
+        return await load_cart(db, user_id, populate_existing=True)
+
+
+# ─────────────────────────────────────────────
+# Memory backend — write-behind
+# ─────────────────────────────────────────────
+@dataclass
+class MemoryCartItem:
+    # Negative ids are lines not yet written to cart_items
+    id: int
+    menu_item_id: int
+    restaurant_id: int
+    quantity: int
+    price_per_item: float
+    notes: Optional[str] = None
+
+    @property
+    def total_price(self) -> float:
+        return self.quantity * self.price_per_item
+
+
+@dataclass
+class MemoryCart:
+    id: int
+    user_id: int
+    items: List[MemoryCartItem] = field(default_factory=list)
+    # temporary id -> cart_items.id, so clients holding a temp id keep working after a flush
+    aliases: Dict[int, int] = field(default_factory=dict)
+    dirty: bool = False
+
+    @property
+    def total_items(self) -> int:
+        return sum(item.quantity for item in self.items)
+
+    @property
+    def total_amount(self) -> int:
+        return round(sum(item.total_price for item in self.items))
+
+    def find(self, item_id) -> Optional[MemoryCartItem]:
+        item_id = self.aliases.get(item_id, item_id)
+        return next((item for item in self.items if item.id == item_id), None)
+
+    def copy(self) -> "MemoryCart":
+        return replace(self, items=[replace(item) for item in self.items], aliases=dict(self.aliases))
+
+
+class MemoryCartStore(CartStore):
+    """
+    Per-worker carts with write-behind persistence to carts/cart_items.
+
+    A cart is hydrated from Postgres on first use. Each change is applied to
+    a copy, which replaces the live cart only once it fully succeeded, so a
+    failed batch or a failed write-through leaves the cart untouched. Dirty
+    carts are flushed according to `flush_mode`, always at
+    checkout and on clean shutdown. Clean carts are evicted LRU.
+    """
+
+    name = "memory"
+
+    def __init__(
+        self,
+        flush_mode: str = CART_FLUSH_MODE,
+        flush_interval: float = CART_FLUSH_INTERVAL,
+        maxsize: int = CART_STORE_MAXSIZE,
+    ):
+        if flush_mode not in FLUSH_MODES:
+            raise ValueError(f"CART_FLUSH_MODE must be one of {FLUSH_MODES}, got {flush_mode!r}")
+        self.flush_mode = flush_mode
+        self.flush_interval = flush_interval
+        self.maxsize = maxsize
+        self._carts = OrderedDict()
+        # user_id -> [lock, requests holding or waiting]; dropped when the count hits 0
+        self._locks = {}
+        self._temp_ids = itertools.count(-1, -1)
+        self._task = None
+
+        self.flushes = 0
+        self.flush_failures = 0
+
+    @asynccontextmanager
+    async def _locked(self, user_id):
+        entry = self._locks.get(user_id)
+        if entry is None:
+            entry = self._locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[user_id]
+
+    async def _load(self, db, user_id) -> MemoryCart:
+        cart = self._carts.get(user_id)
+        if cart is not None:
+            self._carts.move_to_end(user_id)
+            return cart
+
+        db_cart = await get_or_create_cart(db, user_id)
+        cart = MemoryCart(id=db_cart.id, user_id=user_id, items=[
+            MemoryCartItem(
+                id=item.id,
+                menu_item_id=item.menu_item_id,
+                restaurant_id=item.restaurant_id,
+                quantity=item.quantity,
+                price_per_item=item.price_per_item,
+                notes=item.notes,
+            )
+            for item in db_cart.items
+        ])
+        self._remember(user_id, cart)
+        return cart
+
+    def _remember(self, user_id, cart):
+        self._carts[user_id] = cart
+        self._carts.move_to_end(user_id)
+        # Only clean carts may go; dirty ones wait for their flush
+        for key in list(self._carts):
+            if len(self._carts) <= self.maxsize:
+                break
+            if not self._carts[key].dirty and key not in self._locks:
+                del self._carts[key]
+
+    async def _mutate(self, db, user_id, change):
+        async with self._locked(user_id):
+            draft = (await self._load(db, user_id)).copy()
+            result = await change(draft)
+            draft.dirty = True
+            if self.flush_mode == "write_through":
+                await self._persist(db, draft)
+            self._remember(user_id, draft)
+            return result if result is not None else draft
+
+    async def _apply_add(self, db, cart, menu_item_id, restaurant_id, quantity, notes, index=None):
+        existing = next(
+            (item for item in cart.items
+             if item.menu_item_id == menu_item_id and item.restaurant_id == restaurant_id),
+            None,
+        )
+        if existing:
+            existing.quantity += quantity
+            existing.notes = notes if notes is not None else existing.notes
+            return existing
+
+        price = await db.scalar(
+            select(MenuItem.price).where(MenuItem.id == menu_item_id, MenuItem.restaurant_id == restaurant_id)
+        )
+        if price is None:
+            raise _not_found("Menu item not found", index)
+        item = MemoryCartItem(
+            id=next(self._temp_ids),
+            menu_item_id=menu_item_id,
+            restaurant_id=restaurant_id,
+            quantity=quantity,
+            price_per_item=price,
+            notes=notes,
+        )
+        cart.items.append(item)
+        return item
+
+    def _apply_set_quantity(self, cart, item_id, quantity, index=None):
+        item = cart.find(item_id)
+        if item is None:
+            raise _not_found("Item not found in your cart", index)
+        item.quantity = quantity
+        return item
+
+    def _apply_remove(self, cart, item_id, index=None, detail="Item not found"):
+        item = cart.find(item_id)
+        if item is None:
+            raise _not_found(detail, index)
+        cart.items.remove(item)
+
+    async def get_cart(self, db, user_id):
+        async with self._locked(user_id):
+            return await self._load(db, user_id)
+
+    async def add_item(self, db, user_id, menu_item_id, restaurant_id, quantity, notes=None):
+        async def change(cart):
+            return await self._apply_add(db, cart, menu_item_id, restaurant_id, quantity, notes)
+        return await self._mutate(db, user_id, change)
+
+    async def set_quantity(self, db, user_id, item_id, quantity):
+        async def change(cart):
+            return self._apply_set_quantity(cart, item_id, quantity)
+        return await self._mutate(db, user_id, change)
+
+    async def remove_item(self, db, user_id, item_id):
+        async def change(cart):
+            self._apply_remove(cart, item_id)
+        await self._mutate(db, user_id, change)
+
+    async def clear(self, db, user_id):
+        async def change(cart):
+            cart.items.clear()
+        await self._mutate(db, user_id, change)
+
+    async def apply_batch(self, db, user_id, operations):
+        async def change(cart):
+            for index, op in enumerate(operations):
+                if op.op == "add":
+                    await self._apply_add(db, cart, op.menu_item_id, op.restaurant_id, op.quantity, op.notes, index)
+                elif op.op == "update":
+                    self._apply_set_quantity(cart, op.item_id, op.quantity, index)
+                elif op.op == "remove":
+                    self._apply_remove(cart, op.item_id, index, "Item not found in your cart")
+                else:  # clear
+                    cart.items.clear()
+        return await self._mutate(db, user_id, change)
+
+    # ─────────────────────────────────────────
+    # Persistence
+    # ─────────────────────────────────────────
+    async def _persist(self, db, cart: MemoryCart):
+        # Three statements however many changes accumulated: drop removed
+        # lines, upsert the rest, refresh totals.
+        keys = [(item.menu_item_id, item.restaurant_id) for item in cart.items]
+        stale = delete(CartItem).where(CartItem.cart_id == cart.id)
+        if keys:
+            stale = stale.where(tuple_(CartItem.menu_item_id, CartItem.restaurant_id).not_in(keys))
+        await db.execute(stale)
+
+        if cart.items:
+            now = utcnow()
+            stmt = pg_insert(CartItem).values([
+                {
+                    "cart_id": cart.id,
+                    "menu_item_id": item.menu_item_id,
+                    "restaurant_id": item.restaurant_id,
+                    "quantity": item.quantity,
+                    "price_per_item": item.price_per_item,
+                    "total_price": item.total_price,
+                    "notes": item.notes,
+                    "created_at": now,
+                }
+                for item in cart.items
+            ])
+            stmt = stmt.on_conflict_do_update(
+                constraint="unique_cart_item",
+                set_={
+                    "quantity": stmt.excluded.quantity,
+                    "price_per_item": stmt.excluded.price_per_item,
+                    "total_price": stmt.excluded.total_price,
+                    "notes": stmt.excluded.notes,
+                },
+            ).returning(CartItem.id, CartItem.menu_item_id, CartItem.restaurant_id)
+            persisted = {
+                (row.menu_item_id, row.restaurant_id): row.id
+                for row in (await db.execute(stmt)).all()
+            }
+            for item in cart.items:
+                real_id = persisted[(item.menu_item_id, item.restaurant_id)]
+                if item.id != real_id:
+                    cart.aliases[item.id] = real_id
+                    item.id = real_id
+
+        await refresh_cart_totals(db, cart.id)
+        await db.commit()
+        cart.dirty = False
+        self.flushes += 1
+
+    async def flush(self, db, user_id):
+        async with self._locked(user_id):
+            cart = self._carts.get(user_id)
+            if cart is not None and cart.dirty:
+                await self._persist(db, cart)
+
+    @asynccontextmanager
+    async def checkout(self, db, user_id):
+        async with self._locked(user_id):
+            cart = self._carts.get(user_id)
+            if cart is not None and cart.dirty:
+                await self._persist(db, cart)
+            try:
+                yield
+            finally:
+                # The caller changed the rows underneath us; reload on next use
+                self._carts.pop(user_id, None)
+
+    async def flush_dirty(self):
+        for user_id in [key for key, cart in self._carts.items() if cart.dirty]:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.flush(db, user_id)
+            except Exception:
+                self.flush_failures += 1
+                logger.exception("Cart flush failed for user %s", user_id)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush_dirty()
+
+    def start(self):
+        # Called from the startup hook, inside the running loop
+        if self.flush_mode == "interval" and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush_dirty()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "flush_mode": self.flush_mode,
+            "flush_interval_seconds": self.flush_interval,
+            "carts": len(self._carts),
+            "locks": len(self._locks),
+            "maxsize": self.maxsize,
+            "dirty": sum(cart.dirty for cart in self._carts.values()),
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+        }
+
+
+def create_cart_store(backend: str = CART_STORE) -> CartStore:
+    if backend == "postgres":
+        return PostgresCartStore()
+    if backend == "memory":
+        return MemoryCartStore()
+    raise ValueError(f"CART_STORE must be 'postgres' or 'memory', got {backend!r}")
+
+
+cart_store = create_cart_store()
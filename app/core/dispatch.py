@@ -0,0 +1,457 @@
+# app/core/dispatch.py
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import DateTime, Float, Integer, column, or_, select, update, values
+
+from app.core.geo import KM_PER_DEGREE_LAT, distance_km
+from app.core.order_feed import notify_order_event
+from app.core.order_status import READY
+from app.db.session import AsyncSessionLocal
+from app.models.restaurant import DeliveryPartner, Order, Restaurant, utcnow
+
+
+logger = logging.getLogger(__name__)
+
+# 🔹 Tunables
+DISPATCH_CELL_KM = float(os.getenv("DISPATCH_CELL_KM", "1"))
+DISPATCH_MAX_RADIUS_KM = float(os.getenv("DISPATCH_MAX_RADIUS_KM", "10"))
+DISPATCH_STALE_SECONDS = float(os.getenv("DISPATCH_STALE_SECONDS", "60"))      # pings older than this don't count
+DISPATCH_FLUSH_INTERVAL = float(os.getenv("DISPATCH_FLUSH_INTERVAL", "5"))     # location write-back + status sync
+DISPATCH_INTERVAL = float(os.getenv("DISPATCH_INTERVAL", "0"))                 # automatic dispatch, 0 = off
+DISPATCH_BATCH_SIZE = int(os.getenv("DISPATCH_BATCH_SIZE", "100"))
+
+# 🔹 Partner availability
+OFFLINE = "offline"
+AVAILABLE = "available"
+BUSY = "busy"
+PARTNER_STATUSES = (OFFLINE, AVAILABLE, BUSY)
+
+
+def epoch_seconds(value: Optional[datetime]) -> float:
+    # Naive UTC (utcnow) -> unix time; unknown counts as long ago
+    return value.replace(tzinfo=timezone.utc).timestamp() if value else 0.0
+
+
+def naive_utc(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+
+
+@dataclass
+class DriverState:
+    partner_id: int
+    status: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    seen: float = 0.0
+    cell: Optional[tuple] = None
+
+
+class DriverGrid:
+    """
+    Last-known driver positions bucketed into a uniform lat/lng grid.
+
+    A location ping only moves the driver between two cells and marks it
+    dirty; positions reach delivery_partners in one batched UPDATE per flush
+    interval. Availability is owned by the database (claims are conditional
+    UPDATEs) and re-read on every flush, so the grid is a per-worker view that
+    may lag by one interval but can never cause a double assignment.
+    """
+
+    def __init__(self, cell_km: float = DISPATCH_CELL_KM, max_radius_km: float = DISPATCH_MAX_RADIUS_KM,
+                 stale_seconds: float = DISPATCH_STALE_SECONDS):
+        self.cell_km = cell_km
+        self.cell_deg = cell_km / KM_PER_DEGREE_LAT
+        self.lng_cells = math.ceil(360 / self.cell_deg)
+        self.max_radius_km = max_radius_km
+        self.stale_seconds = stale_seconds
+
+        self._drivers = {}      # partner_id -> DriverState
+        self._cells = {}        # (row, col) -> {partner_id}
+        self._partners = {}     # profile_id -> partner_id
+        self._dirty = {}        # partner_id -> (lat, lng, seen)
+        self._lock = threading.Lock()
+
+        self.pings = 0
+        self.searches = 0
+        self.cells_scanned = 0
+
+    def _cell_of(self, latitude: float, longitude: float) -> tuple:
+        return math.floor(latitude / self.cell_deg), math.floor(longitude / self.cell_deg) % self.lng_cells
+
+    def _place(self, driver: DriverState, latitude: float, longitude: float):
+        cell = self._cell_of(latitude, longitude)
+        if cell != driver.cell:
+            if driver.cell is not None:
+                members = self._cells[driver.cell]
+                members.discard(driver.partner_id)
+                if not members:
+                    del self._cells[driver.cell]
+            self._cells.setdefault(cell, set()).add(driver.partner_id)
+            driver.cell = cell
+        driver.latitude, driver.longitude = latitude, longitude
+
+    def _drop(self, partner_id: int):
+        driver = self._drivers.pop(partner_id, None)
+        if driver is not None and driver.cell is not None:
+            members = self._cells[driver.cell]
+            members.discard(partner_id)
+            if not members:
+                del self._cells[driver.cell]
+
+    # 🔹 profile -> partner lookups for the ping endpoint
+    def partner_for(self, profile_id: int) -> Optional[int]:
+        return self._partners.get(profile_id)
+
+    def remember_partner(self, profile_id: int, partner_id: int):
+        with self._lock:
+            self._partners[profile_id] = partner_id
+
+    def ping(self, partner_id: int, latitude: float, longitude: float, seen: Optional[float] = None):
+        # Hot path: no I/O, constant work
+        seen = time.time() if seen is None else seen
+        with self._lock:
+            driver = self._drivers.get(partner_id)
+            if driver is None:
+                # Offline as far as this worker knows; the next sync says otherwise
+                driver = self._drivers[partner_id] = DriverState(partner_id, OFFLINE)
+            self._place(driver, latitude, longitude)
+            driver.seen = seen
+            self._dirty[partner_id] = (latitude, longitude, seen)
+            self.pings += 1
+
+    def set_status(self, partner_id: int, status: str):
+        with self._lock:
+            driver = self._drivers.get(partner_id)
+            if driver is None:
+                driver = self._drivers[partner_id] = DriverState(partner_id, status)
+            driver.status = status
+
+    def nearest(self, latitude: float, longitude: float, exclude=(), now: Optional[float] = None):
+        """
+        (partner_id, distance_km) of the closest fresh, available driver
+        within max_radius_km, or None. Scans square rings of cells outwards
+        and stops as soon as no unscanned cell can hold anyone closer.
+        """
+        now = time.time() if now is None else now
+        # Cells are narrower in km away from the equator; size the rings for
+        # the highest latitude the search can reach
+        edge_lat = min(89.0, abs(latitude) + self.max_radius_km / KM_PER_DEGREE_LAT)
+        ring_km = self.cell_km * math.cos(math.radians(edge_lat))
+        max_ring = math.ceil(self.max_radius_km / ring_km)
+        row, col = self._cell_of(latitude, longitude)
+
+        best = None
+        with self._lock:
+            self.searches += 1
+            for ring in range(max_ring + 1):
+                # Anything outside rings 0..ring-1 is at least (ring - 1) cell widths away
+                if best is not None and best[1] <= (ring - 1) * ring_km:
+                    break
+                for dr in range(-ring, ring + 1):
+                    step = 1 if abs(dr) == ring else 2 * ring or 1
+                    for dc in range(-ring, ring + 1, step):
+                        members = self._cells.get((row + dr, (col + dc) % self.lng_cells))
+                        self.cells_scanned += 1
+                        if not members:
+                            continue
+                        for partner_id in members:
+                            driver = self._drivers[partner_id]
+                            if (driver.status != AVAILABLE or partner_id in exclude
+                                    or now - driver.seen > self.stale_seconds):
+                                continue
+                            distance = distance_km(latitude, longitude, driver.latitude, driver.longitude)
+                            if distance <= self.max_radius_km and (best is None or distance < best[1]):
+                                best = (partner_id, distance)
+        return best
+
+    def take_dirty(self) -> dict:
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            return dirty
+
+    def restore_dirty(self, dirty: dict):
+        # A failed flush: keep the positions unless a newer ping replaced them
+        with self._lock:
+            for partner_id, position in dirty.items():
+                self._dirty.setdefault(partner_id, position)
+
+    def sync(self, rows):
+        """
+        Replace statuses (and positions, when the database has a newer one)
+        with what delivery_partners says. `rows` covers every partner that is
+        not offline; anyone else this worker holds goes offline.
+        """
+        with self._lock:
+            listed = set()
+            for row in rows:
+                listed.add(row.id)
+                self._partners[row.profile_id] = row.id
+                driver = self._drivers.get(row.id)
+                if driver is None:
+                    driver = self._drivers[row.id] = DriverState(row.id, row.status)
+                driver.status = row.status
+                seen = epoch_seconds(row.last_seen_at)
+                if row.last_latitude is not None and row.last_longitude is not None and seen > driver.seen:
+                    self._place(driver, row.last_latitude, row.last_longitude)
+                    driver.seen = seen
+            for partner_id in [pid for pid in self._drivers if pid not in listed]:
+                if partner_id in self._dirty:
+                    self._drivers[partner_id].status = OFFLINE
+                else:
+                    self._drop(partner_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = {status: 0 for status in PARTNER_STATUSES}
+            for driver in self._drivers.values():
+                statuses[driver.status] = statuses.get(driver.status, 0) + 1
+            return {
+                "cell_km": self.cell_km,
+                "drivers": len(self._drivers),
+                "by_status": statuses,
+                "occupied_cells": len(self._cells),
+                "dirty": len(self._dirty),
+                "pings": self.pings,
+                "searches": self.searches,
+                "cells_scanned": self.cells_scanned,
+            }
+
+
+class Dispatcher:
+    """
+    Owns the grid plus the background task that writes pings back, syncs
+    availability from the database and, if DISPATCH_INTERVAL is set, runs
+    dispatch_ready_orders on its own.
+    """
+
+    def __init__(self, flush_interval: float = DISPATCH_FLUSH_INTERVAL, dispatch_interval: float = DISPATCH_INTERVAL,
+                 batch_size: int = DISPATCH_BATCH_SIZE):
+        self.grid = DriverGrid()
+        self.flush_interval = flush_interval
+        self.dispatch_interval = dispatch_interval
+        self.batch_size = batch_size
+        self._task = None
+        self._last_dispatch = 0.0
+
+        self.flushes = 0
+        self.flushed_locations = 0
+        self.flush_failures = 0
+        self.runs = 0
+        self.assigned = 0
+        self.lost_races = 0
+
+    async def flush_locations(self, db):
+        dirty = self.grid.take_dirty()
+        if not dirty:
+            return 0
+        positions = values(
+            column("id", Integer), column("lat", Float), column("lng", Float), column("seen", DateTime),
+            name="positions",
+        ).data([(pid, lat, lng, naive_utc(seen)) for pid, (lat, lng, seen) in dirty.items()])
+        try:
+            await db.execute(
+                update(DeliveryPartner)
+                .where(
+                    DeliveryPartner.id == positions.c.id,
+                    # Another worker may have written a newer ping already
+                    or_(DeliveryPartner.last_seen_at.is_(None), DeliveryPartner.last_seen_at < positions.c.seen),
+                )
+                .values(last_latitude=positions.c.lat, last_longitude=positions.c.lng, last_seen_at=positions.c.seen)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            self.grid.restore_dirty(dirty)
+            raise
+        self.flushes += 1
+        self.flushed_locations += len(dirty)
+        return len(dirty)
+
+    async def sync_partners(self, db):
+        rows = (await db.execute(
+            select(
+                DeliveryPartner.id, DeliveryPartner.profile_id, DeliveryPartner.status,
+                DeliveryPartner.last_latitude, DeliveryPartner.last_longitude, DeliveryPartner.last_seen_at,
+            ).where(DeliveryPartner.status != OFFLINE)
+        )).all()
+        self.grid.sync(rows)
+
+    async def refresh(self):
+        async with AsyncSessionLocal() as db:
+            try:
+                await self.flush_locations(db)
+            except Exception:
+                self.flush_failures += 1
+                logger.exception("Driver location flush failed")
+            await self.sync_partners(db)
+
+    async def _run(self):
+        # First pass hydrates the grid from the table
+        while True:
+            try:
+                await self.refresh()
+                if self.dispatch_interval > 0 and time.monotonic() - self._last_dispatch >= self.dispatch_interval:
+                    self._last_dispatch = time.monotonic()
+                    async with AsyncSessionLocal() as db:
+                        await self.dispatch_ready_orders(db)
+            except Exception:
+                logger.exception("Dispatcher cycle failed")
+            await asyncio.sleep(self.flush_interval)
+
+    def start(self):
+        # Called from the startup hook, inside the running loop
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        try:
+            async with AsyncSessionLocal() as db:
+                await self.flush_locations(db)
+        except Exception:
+            logger.exception("Final driver location flush failed")
+
+    async def set_availability(self, db, partner_id: int, status: str):
+        # Conditional: nobody leaves 'busy' through here, only by finishing the order
+        partner = (await db.execute(
+            update(DeliveryPartner)
+            .where(DeliveryPartner.id == partner_id, DeliveryPartner.status != BUSY)
+            .values(status=status, updated_at=utcnow())
+            .returning(DeliveryPartner)
+            .execution_options(populate_existing=True)
+        )).scalars().first()
+        if partner is not None:
+            await db.commit()
+            self.grid.set_status(partner_id, status)
+        return partner
+
+    async def release_partner(self, db, partner_id: int):
+        """
+        Make a busy partner available again, inside the caller's transaction.
+        The grid is told straight away; if the transaction rolls back, the
+        next sync puts it right, and claims re-check the row anyway.
+        """
+        released = (await db.execute(
+            update(DeliveryPartner)
+            .where(DeliveryPartner.id == partner_id, DeliveryPartner.status == BUSY)
+            .values(status=AVAILABLE, updated_at=utcnow())
+            .returning(DeliveryPartner.id)
+        )).scalar()
+        if released is not None:
+            self.grid.set_status(partner_id, AVAILABLE)
+
+    async def dispatch_ready_orders(self, db, restaurant_id: Optional[int] = None) -> list:
+        """
+        Match unassigned ready delivery orders, oldest first, to the nearest
+        available driver (greedy, one driver per order) and commit the
+        assignments. Returns [(order_id, partner_id, distance_km)].
+
+        Claims are conditional UPDATEs, so concurrent dispatchers on other
+        workers can't hand one driver two orders or one order two drivers;
+        a lost race just leaves the order for the next run.
+        """
+        self.runs += 1
+        query = (
+            select(Order.id, Restaurant.geo_lat, Restaurant.geo_lng)
+            .join(Restaurant, Restaurant.id == Order.restaurant_id)
+            .where(
+                Order.status == READY,
+                Order.order_type == "delivery",
+                Order.delivery_person_id.is_(None),
+                Restaurant.geo_lat.isnot(None),
+                Restaurant.geo_lng.isnot(None),
+            )
+            .order_by(Order.created_at, Order.id)
+            .limit(self.batch_size)
+        )
+        if restaurant_id is not None:
+            query = query.where(Order.restaurant_id == restaurant_id)
+        ready = (await db.execute(query)).all()
+
+        now = time.time()
+        matches = {}  # partner_id -> (order_id, distance)
+        for order_id, latitude, longitude in ready:
+            found = self.grid.nearest(latitude, longitude, exclude=matches, now=now)
+            if found is not None:
+                matches[found[0]] = (order_id, found[1])
+        if not matches:
+            await db.rollback()
+            return []
+
+        stamp = utcnow()
+        claimed = set((await db.execute(
+            update(DeliveryPartner)
+            .where(DeliveryPartner.id.in_(list(matches)), DeliveryPartner.status == AVAILABLE)
+            .values(status=BUSY, updated_at=stamp)
+            .returning(DeliveryPartner.id)
+            .execution_options(synchronize_session=False)
+        )).scalars())
+
+        assigned = {}
+        if claimed:
+            pairs = values(column("order_id", Integer), column("partner_id", Integer), name="pairs").data(
+                [(matches[pid][0], pid) for pid in claimed]
+            )
+            assigned = dict((await db.execute(
+                update(Order)
+                .where(Order.id == pairs.c.order_id, Order.status == READY, Order.delivery_person_id.is_(None))
+                .values(delivery_person_id=pairs.c.partner_id, version=Order.version + 1, updated_at=stamp)
+                .returning(Order.delivery_person_id, Order.id)
+                .execution_options(synchronize_session=False)
+            )).all())
+
+        unused = claimed - set(assigned)
+        if unused:
+            # Order taken (or changed) meanwhile: the driver stays free
+            await db.execute(
+                update(DeliveryPartner)
+                .where(DeliveryPartner.id.in_(list(unused)))
+                .values(status=AVAILABLE)
+                .execution_options(synchronize_session=False)
+            )
+
+        if assigned:
+            orders = (await db.execute(
+                select(Order).where(Order.id.in_(list(assigned.values()))),
+                execution_options={"populate_existing": True},
+            )).scalars().all()
+            for order in orders:
+                await notify_order_event(db, "assigned", order)
+        await db.commit()
+
+        for partner_id in matches.keys() - claimed:
+            # Busy or offline according to the database; refresh our view
+            self.grid.set_status(partner_id, BUSY)
+        for partner_id in assigned:
+            self.grid.set_status(partner_id, BUSY)
+
+        self.assigned += len(assigned)
+        self.lost_races += len(matches) - len(assigned)
+        return [(order_id, partner_id, round(matches[partner_id][1], 3)) for partner_id, order_id in assigned.items()]
+
+    def stats(self) -> dict:
+        return {
+            "grid": self.grid.stats(),
+            "flush_interval_seconds": self.flush_interval,
+            "dispatch_interval_seconds": self.dispatch_interval,
+            "flushes": self.flushes,
+            "flushed_locations": self.flushed_locations,
+            "flush_failures": self.flush_failures,
+            "runs": self.runs,
+            "assigned": self.assigned,
+            "lost_races": self.lost_races,
+        }
+
+
+dispatcher = Dispatcher()
@@ -0,0 +1,60 @@
+# app/core/geo.py
+import math
+
+from sqlalchemy import and_, func, or_
+
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.045
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float):
+    """
+    (min_lat, max_lat, lng_ranges) enclosing a circle of `radius_km`.
+
+    `lng_ranges` is a list of (min_lng, max_lng): two ranges when the box
+    crosses the antimeridian, and None when it reaches a pole (any longitude).
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = latitude - dlat, latitude + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None
+
+    dlng = radius_km / (KM_PER_DEGREE_LAT * math.cos(math.radians(latitude)))
+    if dlng >= 180:
+        return min_lat, max_lat, None
+
+    min_lng, max_lng = longitude - dlng, longitude + dlng
+    if min_lng < -180:
+        return min_lat, max_lat, [(min_lng + 360, 180.0), (-180.0, max_lng)]
+    if max_lng > 180:
+        return min_lat, max_lat, [(min_lng, 180.0), (-180.0, max_lng - 360)]
+    return min_lat, max_lat, [(min_lng, max_lng)]
+
+
+def within_bounding_box(lat_col, lng_col, latitude: float, longitude: float, radius_km: float):
+    # Plain range predicates, so a (lat, lng) B-tree index can serve them
+    min_lat, max_lat, lng_ranges = bounding_box(latitude, longitude, radius_km)
+    clause = lat_col.between(min_lat, max_lat)
+    if lng_ranges is None:
+        return and_(clause, lng_col.isnot(None))
+    return and_(clause, or_(*(lng_col.between(lo, hi) for lo, hi in lng_ranges)))
+
+
+def haversine_km(lat_col, lng_col, latitude: float, longitude: float):
+    # Great-circle distance in km; the asin form stays accurate for short distances
+    dlat = func.radians(lat_col - latitude) / 2
+    dlng = func.radians(lng_col - longitude) / 2
+    a = (
+        func.power(func.sin(dlat), 2)
+        + math.cos(math.radians(latitude)) * func.cos(func.radians(lat_col)) * func.power(func.sin(dlng), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * func.asin(func.least(1.0, func.sqrt(a)))
+
+
+def distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    # Same formula as haversine_km, for points already in memory
+    dlat = math.radians(lat2 - lat1) / 2
+    dlng = math.radians(lng2 - lng1) / 2
+    a = math.sin(dlat) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
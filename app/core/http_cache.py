@@ -0,0 +1,39 @@
+# app/core/http_cache.py
+import os
+
+from fastapi import Request, Response, status
+
+
+# 🔹 How long shared caches / clients may reuse public menu responses unchecked
+MENU_CACHE_MAX_AGE = int(os.getenv("MENU_CACHE_MAX_AGE", "30"))
+
+PUBLIC_MENU_CACHE_CONTROL = f"public, max-age={MENU_CACHE_MAX_AGE}"
+# Authenticated payloads: never shared, always revalidated (cheaply, via ETag)
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    # Weak: the representation is equivalent, not byte-for-byte guaranteed
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in header.split(","))
+
+
+def set_cache_headers(response: Response, etag: str, cache_control: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_cache_headers(response, etag, cache_control)
+    return response
@@ -0,0 +1,243 @@
+# app/core/idempotency.py
+"""
+Idempotency-Key support for order placement.
+
+Stored responses expire after IDEMPOTENCY_TTL. Every worker deletes expired
+rows every IDEMPOTENCY_PRUNE_INTERVAL seconds (app/db/maintenance.py); to
+prune by hand:
+
+    python -m app.core.idempotency prune
+"""
+import argparse
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional
+
+from cachetools import TTLCache
+from fastapi import HTTPException, Response
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.db.maintenance import maintenance
+from app.models.restaurant import IdempotencyKey, utcnow
+
+
+logger = logging.getLogger(__name__)
+
+# 🔹 Tunables. A key is honoured for IDEMPOTENCY_TTL seconds, then may be reused.
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_CACHE_TTL = int(os.getenv("IDEMPOTENCY_CACHE_TTL", "600"))
+IDEMPOTENCY_CACHE_MAXSIZE = int(os.getenv("IDEMPOTENCY_CACHE_MAXSIZE", "20000"))
+IDEMPOTENCY_PRUNE_INTERVAL = int(os.getenv("IDEMPOTENCY_PRUNE_INTERVAL", "3600"))  # 0 = only by hand
+IDEMPOTENCY_PRUNE_BATCH = int(os.getenv("IDEMPOTENCY_PRUNE_BATCH", "5000"))
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+# 🔹 What a retry gets back: the original status and body bytes
+@dataclass(frozen=True)
+class StoredResponse:
+    fingerprint: str
+    status_code: int
+    body: bytes
+
+
+def request_fingerprint(scope: str, payload) -> str:
+    return hashlib.sha256(f"{scope}:{payload.model_dump_json()}".encode()).hexdigest()
+
+
+class IdempotencyCache:
+    """
+    Per-worker TTL cache in front of the idempotency_keys table, keyed by
+    (user_id, scope, key). Most retries arrive within seconds on the same
+    worker and are answered from here; the table covers other workers and
+    restarts.
+    """
+
+    def __init__(self, maxsize: int = IDEMPOTENCY_CACHE_MAXSIZE, ttl: int = IDEMPOTENCY_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, timer=time.monotonic)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.replays = 0
+
+    def get(self, user_id: int, scope: str, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._cache.get((user_id, scope, key))
+            if stored is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return stored
+
+    def put(self, user_id: int, scope: str, key: str, stored: StoredResponse):
+        with self._lock:
+            self._cache[(user_id, scope, key)] = stored
+
+    def record_replay(self):
+        with self._lock:
+            self.replays += 1
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+                "ttl_seconds": self._cache.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "replays": self.replays,
+            }
+
+
+idempotency_cache = IdempotencyCache()
+
+
+def replay(stored: StoredResponse, fingerprint: str) -> Response:
+    if stored.fingerprint != fingerprint:
+        raise HTTPException(422, f"{IDEMPOTENCY_HEADER} was already used for a different request")
+    idempotency_cache.record_replay()
+    return Response(
+        content=stored.body,
+        status_code=stored.status_code,
+        media_type="application/json",
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+@dataclass(frozen=True)
+class IdempotentRequest:
+    user_id: int
+    scope: str
+    key: str
+    fingerprint: str
+
+    @classmethod
+    def from_header(cls, user_id: int, scope: str, key: Optional[str], payload) -> Optional["IdempotentRequest"]:
+        if key is None:
+            return None
+        if not 0 < len(key) <= MAX_KEY_LENGTH:
+            raise HTTPException(400, f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters")
+        return cls(user_id, scope, key, request_fingerprint(scope, payload))
+
+    def cached_response(self) -> Optional[Response]:
+        stored = idempotency_cache.get(self.user_id, self.scope, self.key)
+        return replay(stored, self.fingerprint) if stored else None
+
+    async def stored_response(self, db) -> Optional[Response]:
+        response = self.cached_response()
+        if response is not None:
+            return response
+
+        row = (await db.execute(
+            select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.response_body)
+            .where(
+                IdempotencyKey.user_id == self.user_id,
+                IdempotencyKey.scope == self.scope,
+                IdempotencyKey.key == self.key,
+                IdempotencyKey.created_at >= utcnow() - timedelta(seconds=IDEMPOTENCY_TTL),
+            )
+        )).first()
+        if row is None:
+            return None
+
+        stored = StoredResponse(row.fingerprint, row.status_code, row.response_body.encode())
+        self.remember(stored)
+        return replay(stored, self.fingerprint)
+
+    async def save_response(self, db, status_code: int, body: bytes) -> Optional[StoredResponse]:
+        """
+        Record the response in the caller's transaction. Returns None when a
+        live row already holds the key: a concurrent request with the same
+        key committed first (its INSERT made this one wait), so the caller
+        should roll back and replay that response instead.
+        Call remember() only after the commit.
+        """
+        now = utcnow()
+        stmt = pg_insert(IdempotencyKey).values(
+            user_id=self.user_id,
+            scope=self.scope,
+            key=self.key,
+            fingerprint=self.fingerprint,
+            status_code=status_code,
+            response_body=body.decode(),
+            created_at=now,
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint="unique_idempotency_key",
+            set_={
+                "fingerprint": stmt.excluded.fingerprint,
+                "status_code": stmt.excluded.status_code,
+                "response_body": stmt.excluded.response_body,
+                "created_at": stmt.excluded.created_at,
+            },
+            # An expired key is taken over instead of replayed
+            where=IdempotencyKey.created_at < now - timedelta(seconds=IDEMPOTENCY_TTL),
+        ).returning(IdempotencyKey.id)
+
+        if (await db.execute(stmt)).first() is None:
+            return None
+        return StoredResponse(self.fingerprint, status_code, body)
+
+    def remember(self, stored: StoredResponse):
+        idempotency_cache.put(self.user_id, self.scope, self.key, stored)
+
+
+# ─────────────────────────────────────────────
+# TTL eviction
+# ─────────────────────────────────────────────
+def prune_expired_keys(engine, batch_size: int = IDEMPOTENCY_PRUNE_BATCH) -> int:
+    """
+    Delete rows older than IDEMPOTENCY_TTL, oldest first through the
+    created_at index, one short transaction per batch. Returns the count.
+    """
+    cutoff = utcnow() - timedelta(seconds=IDEMPOTENCY_TTL)
+    expired = (
+        select(IdempotencyKey.id)
+        .where(IdempotencyKey.created_at < cutoff)
+        .order_by(IdempotencyKey.created_at)
+        .limit(batch_size)
+        .scalar_subquery()
+    )
+    pruned = 0
+    while True:
+        with engine.begin() as conn:
+            deleted = conn.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(expired))).rowcount
+        pruned += deleted
+        if deleted < batch_size:
+            break
+    if pruned:
+        logger.info("Pruned %s expired idempotency keys", pruned)
+    return pruned
+
+
+maintenance.register("idempotency_prune", IDEMPOTENCY_PRUNE_INTERVAL, prune_expired_keys)
+
+
+def main(argv=None):
+    from app.db.session import engine
+    from app.models import restaurant, user  # noqa: F401 (registers the tables on Base.metadata)
+
+    parser = argparse.ArgumentParser(prog="python -m app.core.idempotency", description="Idempotency key maintenance")
+    parser.add_argument("command", choices=["prune"])
+    parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    prune_expired_keys(engine)
+
+
+if __name__ == "__main__":
+    main()
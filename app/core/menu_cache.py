@@ -0,0 +1,119 @@
+# app/core/menu_cache.py
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from cachetools import LRUCache
+from sqlalchemy import select, update
+from sqlalchemy.orm import selectinload
+
+from app.core.http_cache import make_etag
+from app.models.restaurant import MenuCategory, MenuItem, Restaurant
+from app.schemas.menu import FullMenuResponse, MenuCategoryWithItems
+
+
+# 🔹 Restaurants whose serialized full menu is kept per worker
+MENU_SNAPSHOT_MAXSIZE = int(os.getenv("MENU_SNAPSHOT_MAXSIZE", "2000"))
+
+
+# 🔹 Call inside the transaction that changes a restaurant's menu (items or
+# categories). The new version becomes visible with the change itself, so
+# ETags and snapshots derived from it can't run ahead of the data.
+async def bump_menu_version(db, *restaurant_ids: int):
+    ids = {restaurant_id for restaurant_id in restaurant_ids if restaurant_id is not None}
+    if not ids:
+        return
+    await db.execute(
+        update(Restaurant)
+        .where(Restaurant.id.in_(ids))
+        # Keep updated_at: it drives the restaurant's own ETag, which a menu edit doesn't change
+        .values(menu_version=Restaurant.menu_version + 1, updated_at=Restaurant.updated_at)
+    )
+
+
+def full_menu_etag(restaurant_id: int, version: int) -> str:
+    return make_etag("full-menu", restaurant_id, version)
+
+
+# 🔹 Full menu serialized once per menu_version
+@dataclass(frozen=True)
+class MenuSnapshot:
+    restaurant_id: int
+    version: int
+    etag: str
+    body: bytes
+
+
+class MenuSnapshotCache:
+    """
+    Per-worker LRU of pre-serialized full menus keyed by restaurant id.
+
+    A snapshot is served only while its version equals the restaurant's
+    current menu_version, so a bump from any worker retires it on that
+    restaurant's next read; no cross-worker invalidation is needed.
+    """
+
+    def __init__(self, maxsize: int = MENU_SNAPSHOT_MAXSIZE):
+        self._cache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+
+    def get(self, restaurant_id: int, version: int) -> Optional[MenuSnapshot]:
+        with self._lock:
+            snapshot = self._cache.get(restaurant_id)
+            if snapshot is not None and snapshot.version == version:
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+            return None
+
+    def put(self, snapshot: MenuSnapshot):
+        with self._lock:
+            self.rebuilds += 1
+            current = self._cache.get(snapshot.restaurant_id)
+            # Never replace a newer snapshot built by a concurrent request
+            if current is None or current.version <= snapshot.version:
+                self._cache[snapshot.restaurant_id] = snapshot
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+                "bytes": sum(len(snapshot.body) for snapshot in self._cache.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "rebuilds": self.rebuilds,
+            }
+
+
+menu_snapshots = MenuSnapshotCache()
+
+
+async def build_menu_snapshot(db, restaurant_id: int, version: int) -> MenuSnapshot:
+    result = await db.execute(
+        select(MenuCategory)
+        .where(MenuCategory.restaurant_id == restaurant_id)
+        .options(selectinload(MenuCategory.menu_items.and_(MenuItem.is_available.is_(True))))
+        .order_by(MenuCategory.id)
+    )
+    categories = [
+        MenuCategoryWithItems.model_validate(category, from_attributes=True)
+        for category in result.scalars().all()
+    ]
+    menu = FullMenuResponse(restaurant_id=restaurant_id, menu_version=version, categories=categories)
+    return MenuSnapshot(
+        restaurant_id=restaurant_id,
+        version=version,
+        etag=full_menu_etag(restaurant_id, version),
+        body=menu.model_dump_json().encode(),
+    )
@@ -0,0 +1,172 @@
+# app/core/menu_popularity.py
+"""
+Best-selling menu items per restaurant (menu_item_sales), kept current from
+order line items in the order's own transaction.
+
+`score` uses forward decay: a sale at time t adds
+quantity * 2 ** ((t - DECAY_LANDMARK) / half-life). Newer sales weigh more,
+and since every score shares the landmark, ranking by score equals ranking
+by exponentially decayed sales without rewriting old rows. Weights grow
+without bound; with a 7-day half-life they stay within float range for
+about 19 years after the landmark. Before then, move the landmark forward
+and divide every score by the same factor.
+
+To backfill or recompute from the orders still attached:
+
+    python -m app.core.menu_popularity rebuild
+"""
+import argparse
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import Float, Integer, column, literal, select, text, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.order_lines import ORDER_LINES_SQL, line_quantities
+from app.core.order_status import CANCELLED, REJECTED
+from app.models.restaurant import MenuItem, MenuItemSales, utcnow
+
+
+logger = logging.getLogger(__name__)
+
+# 🔹 Tunables. 0 disables decay: score is then plain units sold.
+POPULAR_HALF_LIFE_DAYS = float(os.getenv("POPULAR_HALF_LIFE_DAYS", "7"))
+DECAY_LANDMARK = datetime(2024, 1, 1)
+
+
+def decay_weight(at: datetime) -> float:
+    if POPULAR_HALF_LIFE_DAYS <= 0:
+        return 1.0
+    return 2.0 ** ((at - DECAY_LANDMARK).total_seconds() / (POPULAR_HALF_LIFE_DAYS * 86400))
+
+
+def _sold(lines: dict):
+    return values(column("menu_item_id", Integer), column("quantity", Integer), name="sold").data(
+        sorted(lines.items())
+    )
+
+
+async def record_items_sold(db, order):
+    """
+    Add the order's lines, in the caller's transaction. Lines whose item_id
+    isn't on this restaurant's menu are ignored. Rows are written in item id
+    order, so concurrent orders for the same items can't deadlock.
+    """
+    lines = line_quantities(order.items)
+    if not lines:
+        return
+    sold = _sold(lines)
+    weight = decay_weight(order.created_at)
+    stmt = pg_insert(MenuItemSales).from_select(
+        ["restaurant_id", "menu_item_id", "units_sold", "order_count", "score", "updated_at"],
+        select(
+            MenuItem.restaurant_id,
+            MenuItem.id,
+            sold.c.quantity,
+            literal(1),
+            sold.c.quantity * literal(weight, Float),
+            literal(utcnow()),
+        )
+        .join(sold, sold.c.menu_item_id == MenuItem.id)
+        .where(MenuItem.restaurant_id == order.restaurant_id)
+        .order_by(MenuItem.id),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["restaurant_id", "menu_item_id"],
+        set_={
+            "units_sold": MenuItemSales.units_sold + stmt.excluded.units_sold,
+            "order_count": MenuItemSales.order_count + stmt.excluded.order_count,
+            "score": MenuItemSales.score + stmt.excluded.score,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    await db.execute(stmt)
+
+
+async def record_items_status_change(db, order, status: str):
+    # A cancelled or rejected order takes back exactly what it added
+    if status not in (CANCELLED, REJECTED):
+        return
+    lines = line_quantities(order.items)
+    if not lines:
+        return
+    # Lock the rows in item id order first, as record_items_sold does; the
+    # UPDATE's join could otherwise take them in any order and deadlock
+    await db.execute(
+        select(MenuItemSales.menu_item_id)
+        .where(
+            MenuItemSales.restaurant_id == order.restaurant_id,
+            MenuItemSales.menu_item_id.in_(sorted(lines)),
+        )
+        .order_by(MenuItemSales.menu_item_id)
+        .with_for_update()
+    )
+    sold = _sold(lines)
+    weight = decay_weight(order.created_at)
+    await db.execute(
+        update(MenuItemSales)
+        .where(
+            MenuItemSales.restaurant_id == order.restaurant_id,
+            MenuItemSales.menu_item_id == sold.c.menu_item_id,
+        )
+        .values(
+            units_sold=MenuItemSales.units_sold - sold.c.quantity,
+            order_count=MenuItemSales.order_count - 1,
+            score=MenuItemSales.score - sold.c.quantity * literal(weight, Float),
+            updated_at=utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+REBUILD_SQL = f"""
+INSERT INTO menu_item_sales (restaurant_id, menu_item_id, units_sold, order_count, score, updated_at)
+SELECT
+    m.restaurant_id,
+    m.id,
+    sum(line.quantity),
+    count(DISTINCT o.id),
+    sum(line.quantity * CASE WHEN CAST(:half_life AS float8) > 0
+        THEN power(2.0, extract(epoch FROM o.created_at - CAST(:landmark AS timestamp))
+                        / (CAST(:half_life AS float8) * 86400))
+        ELSE 1 END),
+    now() AT TIME ZONE 'utc'
+FROM orders o
+CROSS JOIN LATERAL ({ORDER_LINES_SQL}) AS line
+JOIN menu_items m ON m.id = line.item_id AND m.restaurant_id = o.restaurant_id
+WHERE o.status NOT IN ('{CANCELLED}', '{REJECTED}')
+GROUP BY m.restaurant_id, m.id
+"""
+
+
+def rebuild_popularity(engine) -> int:
+    """
+    Recompute every row from the attached orders. Locking the table first
+    makes concurrent order writes wait, so each is counted exactly once
+    (see rebuild_rollups in app/core/sales_rollup.py).
+    """
+    with engine.begin() as conn:
+        conn.execute(text("LOCK TABLE menu_item_sales IN EXCLUSIVE MODE"))
+        conn.execute(text("DELETE FROM menu_item_sales"))
+        rows = conn.execute(
+            text(REBUILD_SQL), {"half_life": POPULAR_HALF_LIFE_DAYS, "landmark": DECAY_LANDMARK}
+        ).rowcount
+    logger.info("Rebuilt sales counters for %s menu items", rows)
+    return rows
+
+
+def main(argv=None):
+    from app.db.session import engine
+    from app.models import restaurant, user  # noqa: F401 (registers the tables on Base.metadata)
+
+    parser = argparse.ArgumentParser(prog="python -m app.core.menu_popularity", description="Best-seller maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    rebuild_popularity(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# app/core/order_feed.py
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from sqlalchemy import text
+
+from app.db.listener import pg_listener
+from app.schemas.order import OrderSummary
+
+
+logger = logging.getLogger(__name__)
+
+# 🔹 Tunables
+ORDER_FEED_QUEUE_SIZE = int(os.getenv("ORDER_FEED_QUEUE_SIZE", "256"))
+ORDER_FEED_HEARTBEAT = float(os.getenv("ORDER_FEED_HEARTBEAT", "15"))
+
+ORDER_CHANNEL = "order_events"
+
+# Put on a subscriber's queue to end its stream; the client reconnects and
+# gets a fresh snapshot
+END_OF_STREAM = None
+
+
+class OrderFeed:
+    """
+    Fan-out of order events to live per-restaurant subscribers.
+
+    Every worker LISTENs on `order_events` through pg_listener, so an order
+    written by any worker reaches subscribers on all of them. Notifications
+    arrive on the listener thread and are handed to each subscriber's loop.
+    A subscriber that falls behind, or any subscriber after the listener
+    reconnects (notifications may have been missed), has its stream ended
+    rather than silently skipping events.
+    """
+
+    def __init__(self, queue_size: int = ORDER_FEED_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)  # restaurant_id -> {(loop, queue)}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, restaurant_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[restaurant_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, restaurant_id: int, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(restaurant_id)
+            if subscribers is None:
+                return
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                del self._subscribers[restaurant_id]
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event):
+        # Runs on the subscriber's loop
+        if queue.full():
+            return False
+        queue.put_nowait(event)
+        return True
+
+    def _deliver(self, queue: asyncio.Queue, event):
+        if not self._offer(queue, event):
+            self.dropped += 1
+            # Make room for the end marker: this client has to resync anyway
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(END_OF_STREAM)
+        elif event is not END_OF_STREAM:
+            self.delivered += 1
+
+    def dispatch(self, payload: str):
+        # Called on the pg_listener thread
+        try:
+            event = json.loads(payload)
+            restaurant_id = event["order"]["restaurant_id"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed %s payload", ORDER_CHANNEL)
+            return
+        with self._lock:
+            subscribers = list(self._subscribers.get(restaurant_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._deliver, queue, event)
+
+    def reset(self):
+        # Listener (re)connected: anything sent meanwhile is lost, so every
+        # stream restarts from a snapshot
+        with self._lock:
+            subscribers = [entry for entries in self._subscribers.values() for entry in entries]
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._deliver, queue, END_OF_STREAM)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "restaurants": len(self._subscribers),
+                "subscribers": sum(len(entries) for entries in self._subscribers.values()),
+                "published": self.published,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+            }
+
+
+order_feed = OrderFeed()
+
+pg_listener.subscribe(ORDER_CHANNEL, order_feed.dispatch, on_reconnect=order_feed.reset)
+
+
+# 🔹 Call inside the writing transaction, after a flush (so ids and timestamps
+# are set). pg_notify is transactional: subscribers only hear about an order
+# once it is committed, and never about a rolled-back one.
+async def notify_order_event(db, event: str, order):
+    payload = json.dumps({
+        "event": event,
+        "order": OrderSummary.model_validate(order).model_dump(mode="json"),
+    })
+    await db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": ORDER_CHANNEL, "payload": payload})
+    order_feed.published += 1
+
+
+def sse_message(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
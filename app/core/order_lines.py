@@ -0,0 +1,50 @@
+# app/core/order_lines.py
+"""
+How counters (sales rollups, best sellers) read an order's client-supplied
+JSONB `items`, once in Python for live updates and once in SQL for
+rebuilds, so both see the same lines.
+
+A line counts when it is an object whose item_id is a positive integer and
+whose quantity is an integer from 1 to MAX_ORDER_LINE_QUANTITY, both JSON
+numbers. Anything else is skipped. POST /orders rejects such lines up front
+(OrderLine), so skipped lines only come from orders placed before that.
+"""
+from app.schemas.order import MAX_ITEM_ID, MAX_ORDER_LINE_QUANTITY
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def line_quantities(items) -> dict:
+    """{menu_item_id: quantity} over the order's valid lines."""
+    counts = {}
+    for item in items if isinstance(items, list) else ():
+        if not isinstance(item, dict):
+            continue
+        item_id, quantity = item.get("item_id"), item.get("quantity")
+        if not (_is_int(item_id) and 1 <= item_id <= MAX_ITEM_ID):
+            continue
+        if not (_is_int(quantity) and 1 <= quantity <= MAX_ORDER_LINE_QUANTITY):
+            continue
+        counts[item_id] = counts.get(item_id, 0) + quantity
+    return counts
+
+
+def _integer_between(field: str, low: int, high: int) -> str:
+    # The CASE keeps the numeric cast away from non-digit text
+    return (
+        f"jsonb_typeof(item->'{field}') = 'number' "
+        f"AND CASE WHEN item->>'{field}' ~ '^\\d+$' THEN (item->>'{field}')::numeric END BETWEEN {low} AND {high}"
+    )
+
+
+# Subquery yielding (item_id, quantity) for each valid line of the order
+# aliased `o`; use as `CROSS JOIN LATERAL ({ORDER_LINES_SQL}) AS line`.
+ORDER_LINES_SQL = f"""
+    SELECT (item->>'item_id')::int AS item_id, (item->>'quantity')::int AS quantity
+    FROM jsonb_array_elements(CASE WHEN jsonb_typeof(o.items) = 'array' THEN o.items ELSE '[]' END) AS item
+    WHERE jsonb_typeof(item) = 'object'
+      AND {_integer_between("item_id", 1, MAX_ITEM_ID)}
+      AND {_integer_between("quantity", 1, MAX_ORDER_LINE_QUANTITY)}
+"""
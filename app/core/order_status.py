@@ -0,0 +1,37 @@
+# app/core/order_status.py
+
+# 🔹 Order lifecycle
+PENDING = "pending"
+ACCEPTED = "accepted"
+PREPARING = "preparing"
+READY = "ready"
+OUT_FOR_DELIVERY = "out_for_delivery"
+DELIVERED = "delivered"
+CANCELLED = "cancelled"
+REJECTED = "rejected"
+
+# Orders a restaurant still has to act on. ix_orders_restaurant_active is a
+# partial index on exactly this list; queries must use the same values for
+# the planner to pick it.
+ACTIVE_ORDER_STATUSES = (PENDING, ACCEPTED, PREPARING, READY, OUT_FOR_DELIVERY)
+
+# 🔹 Allowed transitions: current status -> statuses it may move to.
+# A status change is one conditional UPDATE whose WHERE clause only accepts
+# the sources of the target status (see sources_of).
+ORDER_TRANSITIONS = {
+    PENDING: {ACCEPTED, REJECTED, CANCELLED},
+    ACCEPTED: {PREPARING, CANCELLED},
+    PREPARING: {READY},
+    READY: {OUT_FOR_DELIVERY, DELIVERED},  # DELIVERED directly for pickup orders
+    OUT_FOR_DELIVERY: {DELIVERED},
+    DELIVERED: set(),
+    CANCELLED: set(),
+    REJECTED: set(),
+}
+
+ORDER_STATUSES = tuple(ORDER_TRANSITIONS)
+
+
+def sources_of(target: str) -> tuple:
+    """Statuses an order may be in to move to `target`."""
+    return tuple(source for source, targets in ORDER_TRANSITIONS.items() if target in targets)
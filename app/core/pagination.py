@@ -0,0 +1,38 @@
+# app/core/pagination.py
+import base64
+import json
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+
+
+# 🔹 Response headers used by cursor-paginated list endpoints
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+def encode_cursor(payload: dict) -> str:
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError):
+        payload = None
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return payload
+
+
+def after_key(columns, values, descending: bool = False):
+    """
+    Keyset predicate: rows strictly after `values` in (columns...) order.
+
+    All columns must sort in the same direction, so a composite index on
+    them can answer it with a single range scan.
+    """
+    key, boundary = tuple_(*columns), tuple_(*values)
+    return key < boundary if descending else key > boundary
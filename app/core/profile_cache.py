@@ -0,0 +1,127 @@
+# app/core/profile_cache.py
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from cachetools import TTLCache
+from sqlalchemy import text
+
+from app.db.listener import pg_listener
+
+
+# 🔹 Tunables. The TTL is only a safety net; writes invalidate via NOTIFY.
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "300"))
+PROFILE_CACHE_MAXSIZE = int(os.getenv("PROFILE_CACHE_MAXSIZE", "50000"))
+
+PROFILE_CHANNEL = "profile_changed"
+
+
+# 🔹 Immutable copy of a Profile row, safe to share between requests
+@dataclass(frozen=True)
+class ProfileSnapshot:
+    id: int
+    firebase_uid: str
+    email: str
+    full_name: str
+    phone_number: Optional[str]
+    profile_picture_url: Optional[str]
+    roles: tuple
+    is_active: int
+    is_verified: int
+    created_at: datetime
+    updated_at: datetime
+
+    @classmethod
+    def from_model(cls, db_user) -> "ProfileSnapshot":
+        return cls(
+            id=db_user.id,
+            firebase_uid=db_user.firebase_uid,
+            email=db_user.email,
+            full_name=db_user.full_name,
+            phone_number=db_user.phone_number,
+            profile_picture_url=db_user.profile_picture_url,
+            roles=tuple(db_user.roles or ()),
+            is_active=db_user.is_active,
+            is_verified=db_user.is_verified,
+            created_at=db_user.created_at,
+            updated_at=db_user.updated_at,
+        )
+
+
+class ProfileCache:
+    """
+    Per-worker cache of ProfileSnapshot keyed by firebase_uid.
+
+    `generation` is bumped on every invalidation; a loader passes the value it
+    saw before reading the row, and the put is dropped if an invalidation
+    landed in between, so a concurrent write can't be overwritten by a stale read.
+    """
+
+    def __init__(self, maxsize: int = PROFILE_CACHE_MAXSIZE, ttl: int = PROFILE_CACHE_TTL):
+        self.ttl = ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=max(ttl, 1))
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, firebase_uid: str) -> Optional[ProfileSnapshot]:
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            profile = self._cache.get(firebase_uid)
+            if profile is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return profile
+
+    def put(self, profile: ProfileSnapshot, generation: int):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if generation == self.generation:
+                self._cache[profile.firebase_uid] = profile
+
+    def invalidate(self, firebase_uid: str):
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            self._cache.pop(firebase_uid, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+profile_cache = ProfileCache()
+
+# Other workers' writes arrive as NOTIFY; after a reconnect we may have missed some
+pg_listener.subscribe(PROFILE_CHANNEL, profile_cache.invalidate, on_reconnect=profile_cache.clear)
+
+
+# 🔹 Call inside the writing transaction, before commit.
+# pg_notify is transactional, so other workers only drop their copy once the
+# write is visible; this worker drops it immediately.
+async def notify_profile_changed(db, firebase_uid: Optional[str]):
+    if not firebase_uid:
+        return
+    profile_cache.invalidate(firebase_uid)
+    await db.execute(text("SELECT pg_notify(:channel, :uid)"), {"channel": PROFILE_CHANNEL, "uid": firebase_uid})
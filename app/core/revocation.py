@@ -0,0 +1,160 @@
+# app/core/revocation.py
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from firebase_admin import auth
+
+
+logger = logging.getLogger(__name__)
+
+# 🔹 Tunables (seconds / entries)
+# REVOCATION_MAX_STALENESS is the longest a revocation can go unnoticed; an entry
+# older than this is re-fetched from Firebase on the request path.
+REVOCATION_MAX_STALENESS = int(os.getenv("REVOCATION_MAX_STALENESS", "300"))
+REVOCATION_REFRESH_INTERVAL = int(os.getenv("REVOCATION_REFRESH_INTERVAL", "60"))
+REVOCATION_MAXSIZE = int(os.getenv("REVOCATION_MAXSIZE", "50000"))
+
+# Firebase caps get_users() at 100 identifiers per call
+_BATCH_SIZE = 100
+
+
+class RevocationWatermarks:
+    """
+    Local map of firebase_uid → tokens_valid_after (epoch seconds).
+
+    Lets session cookies be verified with check_revoked=False: a session is
+    revoked when its `auth_time` is older than the uid's watermark, or the
+    user is disabled/deleted. Entries are seeded on first sight and by
+    logout_user, and kept fresh by a background thread.
+    """
+
+    def __init__(
+        self,
+        max_staleness: int = REVOCATION_MAX_STALENESS,
+        refresh_interval: int = REVOCATION_REFRESH_INTERVAL,
+        maxsize: int = REVOCATION_MAXSIZE,
+    ):
+        self.max_staleness = max_staleness
+        self.refresh_interval = refresh_interval
+        self.maxsize = maxsize
+        # uid -> (tokens_valid_after, disabled, fetched_at)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.last_refresh_at = None
+        self.last_refresh_duration = 0.0
+        self.refresh_count = 0
+        self.refresh_failures = 0
+        self.fallback_lookups = 0
+
+    # ─────────────────────────────────────────────
+    # Watermark map
+    # ─────────────────────────────────────────────
+    def record(self, firebase_uid: str, tokens_valid_after: float, disabled: bool = False):
+        with self._lock:
+            self._entries[firebase_uid] = (tokens_valid_after, disabled, time.time())
+            self._entries.move_to_end(firebase_uid)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def forget(self, firebase_uid: str):
+        with self._lock:
+            self._entries.pop(firebase_uid, None)
+
+    def _fetch(self, firebase_uid: str):
+        try:
+            user = auth.get_user(firebase_uid)
+        except auth.UserNotFoundError:
+            # Deleted users can never be valid again
+            self.record(firebase_uid, float("inf"), True)
+        else:
+            self.record(firebase_uid, (user.tokens_valid_after_timestamp or 0) / 1000, user.disabled)
+        with self._lock:
+            return self._entries.get(firebase_uid)
+
+    def reload(self, firebase_uid: str):
+        """Re-read the uid's watermark from Firebase now (e.g. right after revoking)."""
+        return self._fetch(firebase_uid)
+
+    def cached_verdict(self, firebase_uid: str, auth_time: float):
+        """True/False from a fresh local entry, or None when Firebase must be asked."""
+        with self._lock:
+            entry = self._entries.get(firebase_uid)
+        if entry is None or time.time() - entry[2] > self.max_staleness:
+            return None
+        tokens_valid_after, disabled, _ = entry
+        return disabled or auth_time < tokens_valid_after
+
+    def is_revoked(self, firebase_uid: str, auth_time: float) -> bool:
+        # Blocking on a cache miss; async callers should try cached_verdict first
+        verdict = self.cached_verdict(firebase_uid, auth_time)
+        if verdict is not None:
+            return verdict
+
+        with self._lock:
+            self.fallback_lookups += 1
+        tokens_valid_after, disabled, _ = self._fetch(firebase_uid)
+        return disabled or auth_time < tokens_valid_after
+
+    # ─────────────────────────────────────────────
+    # Background refresh
+    # ─────────────────────────────────────────────
+    def refresh(self):
+        started = time.time()
+        with self._lock:
+            uids = list(self._entries)
+
+        for i in range(0, len(uids), _BATCH_SIZE):
+            batch = uids[i:i + _BATCH_SIZE]
+            result = auth.get_users([auth.UidIdentifier(uid) for uid in batch])
+            for user in result.users:
+                self.record(user.uid, (user.tokens_valid_after_timestamp or 0) / 1000, user.disabled)
+            for missing in result.not_found:
+                self.record(missing.uid, float("inf"), True)
+
+        self.last_refresh_at = time.time()
+        self.last_refresh_duration = self.last_refresh_at - started
+        self.refresh_count += 1
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception:
+                self.refresh_failures += 1
+                logger.exception("Revocation watermark refresh failed")
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="revocation-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            tracked = len(self._entries)
+            oldest = min((entry[2] for entry in self._entries.values()), default=None)
+        return {
+            "tracked_uids": tracked,
+            "max_staleness_seconds": self.max_staleness,
+            "refresh_interval_seconds": self.refresh_interval,
+            "refresh_count": self.refresh_count,
+            "refresh_failures": self.refresh_failures,
+            "last_refresh_duration_seconds": round(self.last_refresh_duration, 3),
+            "refresh_lag_seconds": round(now - self.last_refresh_at, 3) if self.last_refresh_at else None,
+            "oldest_entry_age_seconds": round(now - oldest, 3) if oldest else None,
+            "fallback_lookups": self.fallback_lookups,
+        }
+
+
+revocation_watermarks = RevocationWatermarks()
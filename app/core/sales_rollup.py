@@ -0,0 +1,136 @@
+# app/core/sales_rollup.py
+"""
+Hourly sales counters per restaurant (restaurant_sales_rollups).
+
+Order writes add their deltas in their own transaction, so the rollups are
+exactly as committed as the orders. To recompute them from the orders that
+are still attached (after a manual fix, or to backfill):
+
+    python -m app.core.sales_rollup rebuild [--since YYYY-MM-DD]
+"""
+import argparse
+import logging
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.order_lines import ORDER_LINES_SQL, line_quantities
+from app.core.order_status import CANCELLED, DELIVERED, REJECTED
+from app.models.restaurant import RestaurantSalesRollup, utcnow
+
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = (
+    "orders_placed", "gross_amount", "items_sold",
+    "orders_cancelled", "cancelled_amount",
+    "orders_delivered", "delivered_amount",
+)
+
+
+def items_quantity(items) -> int:
+    # Same lines the best-seller counters count (app/core/order_lines.py)
+    return sum(line_quantities(items).values())
+
+
+async def add_to_rollup(db, order, **deltas):
+    """
+    Upsert the order's (restaurant, day, hour) bucket, adding `deltas`.
+    Runs in the caller's transaction; the row stays locked until it commits,
+    so keep the commit close.
+    """
+    created_at = order.created_at
+    stmt = pg_insert(RestaurantSalesRollup).values(
+        restaurant_id=order.restaurant_id,
+        day=created_at.date(),
+        hour=created_at.hour,
+        updated_at=utcnow(),
+        **deltas,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["restaurant_id", "day", "hour"],
+        set_={
+            **{name: getattr(RestaurantSalesRollup, name) + getattr(stmt.excluded, name) for name in deltas},
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    await db.execute(stmt)
+
+
+async def record_order_placed(db, order):
+    await add_to_rollup(
+        db, order, orders_placed=1, gross_amount=order.total_amount, items_sold=items_quantity(order.items)
+    )
+
+
+async def record_status_change(db, order, status: str):
+    # Counted against the hour the order was placed, like its revenue
+    if status in (CANCELLED, REJECTED):
+        await add_to_rollup(
+            db, order, orders_cancelled=1, cancelled_amount=order.total_amount, items_sold=-items_quantity(order.items)
+        )
+    elif status == DELIVERED:
+        await add_to_rollup(db, order, orders_delivered=1, delivered_amount=order.total_amount)
+
+
+REBUILD_SQL = f"""
+INSERT INTO restaurant_sales_rollups (restaurant_id, day, hour, {", ".join(COUNTERS)}, updated_at)
+SELECT
+    o.restaurant_id,
+    o.created_at::date,
+    extract(hour FROM o.created_at)::int,
+    count(*),
+    coalesce(sum(o.total_amount), 0),
+    coalesce(sum((SELECT sum(line.quantity) FROM ({ORDER_LINES_SQL}) AS line))
+        FILTER (WHERE o.status NOT IN ('{CANCELLED}', '{REJECTED}')), 0),
+    count(*) FILTER (WHERE o.status IN ('{CANCELLED}', '{REJECTED}')),
+    coalesce(sum(o.total_amount) FILTER (WHERE o.status IN ('{CANCELLED}', '{REJECTED}')), 0),
+    count(*) FILTER (WHERE o.status = '{DELIVERED}'),
+    coalesce(sum(o.total_amount) FILTER (WHERE o.status = '{DELIVERED}'), 0),
+    now() AT TIME ZONE 'utc'
+FROM orders o
+WHERE o.created_at >= :since
+GROUP BY 1, 2, 3
+"""
+
+
+def rebuild_rollups(engine, since: Optional[date] = None) -> int:
+    """
+    Recompute buckets from `since` (default: the oldest attached order)
+    onwards. Older buckets are left alone, so months already archived
+    (app/db/partitions.py) keep their figures.
+
+    Locking the table first makes concurrent order writes wait at their
+    upsert: each one is then either counted by the INSERT ... SELECT
+    (committed before it) or added on top afterwards, never both.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("LOCK TABLE restaurant_sales_rollups IN EXCLUSIVE MODE"))
+        if since is None:
+            oldest = conn.execute(text("SELECT min(created_at) FROM orders")).scalar()
+            if oldest is None:
+                return 0
+            since = oldest.date()
+        conn.execute(text("DELETE FROM restaurant_sales_rollups WHERE day >= :since"), {"since": since})
+        rows = conn.execute(text(REBUILD_SQL), {"since": since}).rowcount
+    logger.info("Rebuilt %s sales rollup buckets since %s", rows, since)
+    return rows
+
+
+def main(argv=None):
+    from app.db.session import engine
+    from app.models import restaurant, user  # noqa: F401 (registers the tables on Base.metadata)
+
+    parser = argparse.ArgumentParser(prog="python -m app.core.sales_rollup", description="Sales rollup maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--since", type=date.fromisoformat, default=None)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    rebuild_rollups(engine, since=args.since)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# app/core/session_cache.py
+import hashlib
+import os
+import threading
+import time
+
+from cachetools import TLRUCache
+
+
+# 🔹 Tunables (seconds / entries). SESSION_CACHE_TTL=0 disables the cache.
+SESSION_CACHE_TTL = int(os.getenv("SESSION_CACHE_TTL", "60"))
+SESSION_CACHE_MAXSIZE = int(os.getenv("SESSION_CACHE_MAXSIZE", "10000"))
+
+
+class SessionClaimsCache:
+    """
+    Bounded LRU cache of verified session-cookie claims.
+
+    Entries are keyed by a SHA-256 of the cookie (the raw cookie is never kept)
+    and live until `ttl` seconds pass or the cookie's own `exp`, whichever
+    comes first. Only the signature check is cached; revocation is still
+    checked per request against the local watermarks.
+    """
+
+    def __init__(self, maxsize: int = SESSION_CACHE_MAXSIZE, ttl: int = SESSION_CACHE_TTL):
+        self.ttl = ttl
+        self._cache = TLRUCache(maxsize=maxsize, ttu=self._ttu, timer=time.time)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _ttu(self, key, claims, now):
+        expires_at = now + self.ttl
+        exp = claims.get("exp")
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        return expires_at
+
+    @staticmethod
+    def _key(session_cookie: str) -> str:
+        return hashlib.sha256(session_cookie.encode()).hexdigest()
+
+    def get(self, session_cookie: str):
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            claims = self._cache.get(self._key(session_cookie))
+            if claims is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return claims
+
+    def put(self, session_cookie: str, claims: dict):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._cache[self._key(session_cookie)] = claims
+
+    def invalidate_cookie(self, session_cookie: str):
+        with self._lock:
+            if self._cache.pop(self._key(session_cookie), None) is not None:
+                self.invalidations += 1
+
+    def invalidate_user(self, firebase_uid: str):
+        # Logout is rare, so a scan of the bounded cache is fine here
+        with self._lock:
+            stale = [key for key, claims in self._cache.items() if claims.get("uid") == firebase_uid]
+            for key in stale:
+                self._cache.pop(key, None)
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+session_cache = SessionClaimsCache()
@@ -0,0 +1,31 @@
+# app/core/text_search.py
+import os
+
+from sqlalchemy import Float, literal, or_, text
+
+
+# 🔹 Minimum pg_trgm word similarity (0..1) for a fuzzy match. Lower values
+# tolerate more typos but match more loosely.
+NAME_SIMILARITY_THRESHOLD = float(os.getenv("RESTAURANT_NAME_SIMILARITY", "0.4"))
+
+
+async def use_similarity_threshold(db, threshold: float = NAME_SIMILARITY_THRESHOLD):
+    # Transaction-local, so pooled connections don't keep the setting
+    await db.execute(
+        text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+        {"threshold": str(threshold)},
+    )
+
+
+def fuzzy_match(column, query: str):
+    # Substring hits plus typo-tolerant word-similarity hits; both can use a
+    # gin_trgm_ops index on `column`
+    return or_(
+        column.icontains(query, autoescape=True),
+        literal(query).bool_op("<%")(column),
+    )
+
+
+def match_distance(column, query: str):
+    # 1 - word_similarity: 0 is a perfect match, so ascending order is best-first
+    return literal(query).op("<<->", return_type=Float)(column)
@@ -0,0 +1,104 @@
+import logging
+import select
+import threading
+from collections import defaultdict
+
+import psycopg2
+import psycopg2.extensions
+
+from app.db.session import DB_CONNECT_ARGS
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds to block in select() before re-checking the stop flag
+_POLL_TIMEOUT = 5.0
+_MAX_BACKOFF = 30.0
+
+
+class PgListener:
+    """
+    Background thread that LISTENs on Postgres channels and dispatches
+    NOTIFY payloads to in-process callbacks.
+
+    Uses its own psycopg2 connection (outside the SQLAlchemy pool) because it
+    must stay idle in LISTEN. Notifications sent while disconnected are lost,
+    so every subscriber gets an `on_reconnect` hook to drop derived state.
+    """
+
+    def __init__(self, connect_args: dict = DB_CONNECT_ARGS):
+        self.connect_args = connect_args
+        self._handlers = defaultdict(list)
+        self._reconnect_handlers = []
+        self._stop = threading.Event()
+        self._thread = None
+        self.received = 0
+        self.reconnects = 0
+
+    def subscribe(self, channel: str, callback, on_reconnect=None):
+        self._handlers[channel].append(callback)
+        if on_reconnect is not None:
+            self._reconnect_handlers.append(on_reconnect)
+
+    def _connect(self):
+        conn = psycopg2.connect(**{k: v for k, v in self.connect_args.items() if v not in (None, "")})
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            for channel in self._handlers:
+                cur.execute(f'LISTEN "{channel}"')
+        return conn
+
+    def _dispatch(self, channel: str, payload: str):
+        self.received += 1
+        for callback in self._handlers.get(channel, ()):
+            try:
+                callback(payload)
+            except Exception:
+                logger.exception("NOTIFY handler for %s failed", channel)
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                self.reconnects += 1
+                for hook in self._reconnect_handlers:
+                    hook()
+                backoff = 1.0
+
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], _POLL_TIMEOUT) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._dispatch(notify.channel, notify.payload)
+            except Exception:
+                logger.exception("Postgres listener disconnected; retrying in %.0fs", backoff)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, _MAX_BACKOFF)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def start(self):
+        if not self._handlers or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pg-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            "channels": sorted(self._handlers),
+            "received": self.received,
+            "reconnects": self.reconnects,
+            "alive": self._thread is not None and self._thread.is_alive(),
+        }
+
+
+pg_listener = PgListener()
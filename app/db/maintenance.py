@@ -0,0 +1,89 @@
+# app/db/maintenance.py
+import logging
+import os
+import threading
+import time
+
+from app.db.session import engine
+
+
+logger = logging.getLogger(__name__)
+
+# 🔹 How often the thread checks for due jobs (seconds)
+MAINTENANCE_TICK = float(os.getenv("MAINTENANCE_TICK", "30"))
+
+
+class PeriodicMaintenance:
+    """
+    Background thread that runs housekeeping jobs (partition creation, TTL
+    pruning) on the sync engine, each every `interval` seconds. Every worker
+    runs them, so jobs must be idempotent and cheap when there is nothing to
+    do. Modules register their jobs at import, like pg_listener.subscribe.
+    """
+
+    def __init__(self, bind=engine, tick: float = MAINTENANCE_TICK):
+        self.bind = bind
+        self.tick = tick
+        # name -> {"interval", "fn", "due", "runs", "failures", "last_duration", "last_result"}
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, name: str, interval: float, fn):
+        """fn(engine) runs every `interval` seconds; 0 or less disables it."""
+        if interval <= 0:
+            return
+        with self._lock:
+            self._jobs[name] = {
+                "interval": interval, "fn": fn, "due": time.monotonic() + interval,
+                "runs": 0, "failures": 0, "last_duration": 0.0, "last_result": None,
+            }
+
+    def run_due(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [(name, job) for name, job in self._jobs.items() if job["due"] <= now]
+        for name, job in due:
+            started = time.monotonic()
+            try:
+                job["last_result"] = job["fn"](self.bind)
+                job["runs"] += 1
+            except Exception:
+                job["failures"] += 1
+                logger.exception("Maintenance job %s failed", name)
+            job["last_duration"] = time.monotonic() - started
+            job["due"] = time.monotonic() + job["interval"]
+
+    def _run(self):
+        while not self._stop.wait(self.tick):
+            self.run_due()
+
+    def start(self):
+        if not self._jobs or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "alive": self._thread is not None and self._thread.is_alive(),
+                "jobs": {
+                    name: {
+                        "interval_seconds": job["interval"],
+                        "runs": job["runs"],
+                        "failures": job["failures"],
+                        "last_duration_seconds": round(job["last_duration"], 3),
+                        "last_result": job["last_result"],
+                    }
+                    for name, job in self._jobs.items()
+                },
+            }
+
+
+maintenance = PeriodicMaintenance()
@@ -0,0 +1,282 @@
+# app/db/partitions.py
+"""
+Monthly range partitions for orders and order_status_history.
+
+    python -m app.db.partitions ensure    # this month + PARTITION_PREMAKE_MONTHS ahead
+    python -m app.db.partitions archive   # detach months past PARTITION_RETENTION_MONTHS
+    python -m app.db.partitions convert   # one-off: move unpartitioned tables over
+    python -m app.db.partitions list
+
+`ensure` also runs at startup and then every PARTITION_ENSURE_INTERVAL
+seconds in each worker (app/db/maintenance.py), so inserts never find their
+month missing; schedule `archive` daily. Archived months move to the
+ARCHIVE_SCHEMA schema: still queryable there, but no longer visible through
+the API.
+
+Queries prune to the months they need only when they bound the partition
+key: list endpoints take a created_at window (created_window), and lookups
+by (id, created_at) read one month. A lookup by id alone can't prune; it
+probes every attached month's primary key index.
+"""
+import argparse
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import text
+
+from app.db.base import Base
+from app.db.maintenance import maintenance
+
+
+logger = logging.getLogger(__name__)
+
+# 🔹 Tunables
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", "3"))
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "12"))
+PARTITION_LOCK_TIMEOUT = os.getenv("PARTITION_LOCK_TIMEOUT", "5s")  # give up rather than queue behind traffic
+ARCHIVE_SCHEMA = os.getenv("ARCHIVE_SCHEMA", "archive")
+PARTITION_ENSURE_INTERVAL = int(os.getenv("PARTITION_ENSURE_INTERVAL", "21600"))  # 0 = startup / cron only
+ORDER_LIST_DEFAULT_DAYS = int(os.getenv("ORDER_LIST_DEFAULT_DAYS", "30"))  # window when a listing gives none
+
+# (table, partition key). History is keyed on its order's created_at, so both
+# tables split on the same months and archive together.
+PARTITIONED_TABLES = [
+    ("orders", "created_at"),
+    ("order_status_history", "order_created_at"),
+]
+
+PARTITION_SUFFIX = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def utc_today() -> date:
+    # created_at is naive UTC, so "this month" must be the UTC one, not the host's
+    return datetime.now(timezone.utc).date()
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_partitioned(conn, table: str) -> bool:
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}
+    ).scalar()
+    return relkind == "p"
+
+
+def attached_partitions(conn, table: str) -> list:
+    """[(partition name, month)] currently attached to `table`, oldest first."""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    ), {"table": table}).scalars()
+    months = []
+    for name in names:
+        match = PARTITION_SUFFIX.search(name)
+        if match:
+            months.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(months, key=lambda entry: entry[1])
+
+
+def create_partition(conn, table: str, month: date) -> str:
+    name = partition_name(table, month)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+    return name
+
+
+def created_window(column, created_from: Optional[datetime] = None, created_to: Optional[datetime] = None,
+                   default_days: int = ORDER_LIST_DEFAULT_DAYS) -> list:
+    """
+    WHERE conditions bounding `column` (a partition key) to
+    [created_from, created_to), so the planner reads only those months.
+    created_from defaults to `default_days` before created_to (or now).
+    Aware datetimes are converted to the columns' naive UTC.
+    """
+    def naive_utc(value):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    created_from, created_to = naive_utc(created_from), naive_utc(created_to)
+    if created_from is None:
+        created_from = (created_to or datetime.now(timezone.utc).replace(tzinfo=None)) - timedelta(days=default_days)
+    conditions = [column >= created_from]
+    if created_to is not None:
+        conditions.append(column < created_to)
+    return conditions
+
+
+def ensure_partitions(engine, months_ahead: int = PARTITION_PREMAKE_MONTHS, today: date = None) -> list:
+    """
+    Create any missing partition from this month to `months_ahead` months
+    out. Creating one briefly locks the parent exclusively, bounded by
+    PARTITION_LOCK_TIMEOUT; a run that gives up is retried next interval.
+    """
+    first = month_start(today or utc_today())
+    created = []
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'"))
+        for table, _ in PARTITIONED_TABLES:
+            if not is_partitioned(conn, table):
+                logger.warning("%s is not partitioned; run `python -m app.db.partitions convert`", table)
+                continue
+            existing = {month for _, month in attached_partitions(conn, table)}
+            for offset in range(months_ahead + 1):
+                month = add_months(first, offset)
+                if month not in existing:
+                    created.append(create_partition(conn, table, month))
+    if created:
+        logger.info("Created partitions: %s", ", ".join(created))
+    return created
+
+
+maintenance.register("ensure_partitions", PARTITION_ENSURE_INTERVAL, ensure_partitions)
+
+
+def archive_partitions(engine, retention_months: int = PARTITION_RETENTION_MONTHS, today: date = None) -> list:
+    """
+    Detach every month that ended more than `retention_months` ago and move
+    it to ARCHIVE_SCHEMA. One short transaction per partition; DETACH needs
+    a brief exclusive lock on the parent, bounded by PARTITION_LOCK_TIMEOUT.
+    """
+    cutoff = add_months(month_start(today or utc_today()), -retention_months)
+    archived = []
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+    # History first: a month of orders never sits in the archive without its history
+    for table, _ in reversed(PARTITIONED_TABLES):
+        with engine.connect() as conn:
+            if not is_partitioned(conn, table):
+                continue
+            expired = [name for name, month in attached_partitions(conn, table) if add_months(month, 1) <= cutoff]
+        for name in expired:
+            with engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'"))
+                conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+            archived.append(name)
+    if archived:
+        logger.info("Archived partitions to %s: %s", ARCHIVE_SCHEMA, ", ".join(archived))
+    return archived
+
+
+def _rename_indexes(conn, table: str, suffix: str):
+    # The partitioned replacement reuses the index names
+    for name in conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table"
+    ), {"table": table}).scalars():
+        conn.execute(text(f'ALTER INDEX "{name}" RENAME TO "{name[:63 - len(suffix)]}{suffix}"'))
+
+
+def _drop_foreign_keys_to(conn, table: str):
+    for referencing, constraint in conn.execute(text(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE contype = 'f' AND confrelid = to_regclass(:table)"
+    ), {"table": table}).all():
+        conn.execute(text(f'ALTER TABLE {referencing} DROP CONSTRAINT "{constraint}"'))
+
+
+def convert_tables(engine, suffix: str = "_unpartitioned", months_ahead: int = PARTITION_PREMAKE_MONTHS) -> list:
+    """
+    Replace plain orders / order_status_history tables with partitioned
+    ones in a single transaction, copying every row into its month. The old
+    tables are kept as <table><suffix> for the operator to drop. Holds an
+    exclusive lock on both tables for the whole copy: run it in a
+    maintenance window, before this version serves traffic.
+    """
+    converted = []
+    with engine.begin() as conn:
+        tables = [table for table, _ in PARTITIONED_TABLES if not is_partitioned(conn, table)]
+        if not tables:
+            return converted
+        conn.execute(text(f"LOCK TABLE {', '.join(tables)} IN ACCESS EXCLUSIVE MODE"))
+
+        for table in tables:
+            # Foreign keys can't point at a partitioned table's id alone
+            _drop_foreign_keys_to(conn, table)
+            _rename_indexes(conn, table, suffix)
+            conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}{suffix}"))
+            Base.metadata.tables[table].create(conn)
+            converted.append(table)
+
+        # Orders without a timestamp go to the month they were last touched
+        if "orders" in tables:
+            conn.execute(text(
+                f"UPDATE orders{suffix} SET created_at = COALESCE(updated_at, now() AT TIME ZONE 'utc') "
+                "WHERE created_at IS NULL"
+            ))
+        first, last = conn.execute(text(
+            f"SELECT min(created_at), max(created_at) FROM orders{suffix if 'orders' in tables else ''}"
+        )).one()
+        today = utc_today()
+        month = month_start(first.date()) if first else month_start(today)
+        final = add_months(month_start(max(last.date(), today) if last else today), months_ahead)
+        while month <= final:
+            for table in tables:
+                create_partition(conn, table, month)
+            month = add_months(month, 1)
+
+        if "orders" in tables:
+            columns = ", ".join(column.name for column in Base.metadata.tables["orders"].columns)
+            conn.execute(text(f"INSERT INTO orders ({columns}) SELECT {columns} FROM orders{suffix}"))
+            conn.execute(text(
+                "SELECT setval(pg_get_serial_sequence('orders', 'id'), COALESCE(max(id), 0) + 1, false) FROM orders"
+            ))
+        if "order_status_history" in tables:
+            conn.execute(text(
+                "INSERT INTO order_status_history (id, order_id, order_created_at, status, updated_by, timestamp) "
+                f"SELECT h.id, h.order_id, o.created_at, h.status, h.updated_by, h.timestamp "
+                f"FROM order_status_history{suffix} h JOIN orders o ON o.id = h.order_id"
+            ))
+            conn.execute(text(
+                "SELECT setval(pg_get_serial_sequence('order_status_history', 'id'), COALESCE(max(id), 0) + 1, false) "
+                "FROM order_status_history"
+            ))
+    logger.info("Converted to partitioned tables: %s", ", ".join(converted))
+    return converted
+
+
+def main(argv=None):
+    from app.db.session import engine
+    from app.db.schema import upgrade_schema
+    from app.models import restaurant, user  # noqa: F401 (registers the tables on Base.metadata)
+
+    parser = argparse.ArgumentParser(prog="python -m app.db.partitions", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["ensure", "archive", "convert", "list"])
+    parser.add_argument("--months-ahead", type=int, default=PARTITION_PREMAKE_MONTHS)
+    parser.add_argument("--retention-months", type=int, default=PARTITION_RETENTION_MONTHS)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "ensure":
+        ensure_partitions(engine, months_ahead=args.months_ahead)
+    elif args.command == "archive":
+        archive_partitions(engine, retention_months=args.retention_months)
+    elif args.command == "convert":
+        # Bring the old tables up to date first, so every mapped column exists to copy
+        upgrade_schema(engine)
+        convert_tables(engine, months_ahead=args.months_ahead)
+    else:
+        with engine.connect() as conn:
+            for table, key in PARTITIONED_TABLES:
+                months = [name for name, _ in attached_partitions(conn, table)]
+                print(f"{table} ({key}): {', '.join(months) or 'not partitioned'}")
+
+
+if __name__ == "__main__":
+    main()
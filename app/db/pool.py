@@ -0,0 +1,90 @@
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+
+logger = logging.getLogger(__name__)
+
+# Checkouts slower than this are logged with a pool snapshot
+DB_POOL_SLOW_CHECKOUT_MS = float(os.getenv("DB_POOL_SLOW_CHECKOUT_MS", "100"))
+
+
+class PoolWaitStats:
+    """Checkout latency counters for one engine's pool."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.slow_checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, pool, waited: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+            slow = waited * 1000 >= DB_POOL_SLOW_CHECKOUT_MS
+            if slow:
+                self.slow_checkouts += 1
+        if timed_out or slow:
+            logger.warning(
+                "DB pool %s: checkout %s after %.1fms (size=%d checked_out=%d overflow=%d)",
+                self.name, "timed out" if timed_out else "waited", waited * 1000,
+                pool.size(), pool.checkedout(), pool.overflow(),
+            )
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            return {
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "slow_checkouts": self.slow_checkouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
+
+
+class _InstrumentedPoolMixin:
+    # Subclasses of QueuePool that time every checkout (queue wait + connect/pre-ping)
+
+    # Named after create_engine(pool_logging_name=...)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats(self._orig_logging_name or "default")
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            conn = super().connect()
+        except exc.TimeoutError:
+            self.wait_stats.record(self, time.perf_counter() - started, timed_out=True)
+            raise
+        self.wait_stats.record(self, time.perf_counter() - started)
+        return conn
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
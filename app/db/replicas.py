@@ -0,0 +1,100 @@
+import itertools
+import os
+import time
+from http.cookies import SimpleCookie
+
+from fastapi import Request
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.pool import InstrumentedAsyncAdaptedQueuePool
+from app.db.session import (
+    AsyncSessionLocal, POOL_OPTIONS, db_async_driver, user, password, database,
+)
+
+
+# 🔹 Comma-separated "host[:port]" list; same credentials and database as the primary
+DB_REPLICA_HOSTS = [h.strip() for h in os.getenv("DB_REPLICA_HOSTS", "").split(",") if h.strip()]
+# After a successful write the client reads from the primary for this long
+DB_READ_YOUR_WRITES_SECONDS = int(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+
+PIN_COOKIE = "db_pin"
+WRITE_METHODS = {b"POST", b"PUT", b"PATCH", b"DELETE"}
+
+
+def _replica_url(replica: str) -> str:
+    replica_host, _, replica_port = replica.partition(":")
+    return f"postgresql+{db_async_driver}://{user}:{password}@{replica_host}:{replica_port or 5432}/{database}"
+
+
+replica_engines = [
+    create_async_engine(
+        _replica_url(replica),
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+        pool_logging_name=f"replica{i}",
+        **POOL_OPTIONS,
+    )
+    for i, replica in enumerate(DB_REPLICA_HOSTS)
+]
+_next_replica = itertools.cycle(replica_engines) if replica_engines else None
+
+
+def pinned_to_primary(cookies) -> bool:
+    try:
+        return float(cookies.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+# 🔹 Session for read-only routes: a replica (round robin) unless there are
+# none or the client wrote recently, in which case the primary.
+async def get_read_db(request: Request):
+    if _next_replica is None or pinned_to_primary(request.cookies):
+        bind = None
+    else:
+        bind = next(_next_replica)
+
+    session = AsyncSessionLocal(bind=bind) if bind is not None else AsyncSessionLocal()
+    async with session as db:
+        yield db
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pure ASGI middleware: on a successful write request, set a short-lived
+    cookie that pins the client's reads to the primary. A cookie (rather
+    than per-worker state) keeps the pin across workers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not replica_engines
+            or scope["method"].encode() not in WRITE_METHODS
+        ):
+            return await self.app(scope, receive, send)
+
+        async def send_with_pin(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + DB_READ_YOUR_WRITES_SECONDS
+                cookie = SimpleCookie()
+                cookie[PIN_COOKIE] = f"{until:.3f}"
+                cookie[PIN_COOKIE]["max-age"] = DB_READ_YOUR_WRITES_SECONDS
+                cookie[PIN_COOKIE]["path"] = "/"
+                cookie[PIN_COOKIE]["httponly"] = True
+                cookie[PIN_COOKIE]["samesite"] = "lax"
+                headers = list(message.get("headers", []))
+                headers.append((b"set-cookie", cookie.output(header="").strip().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_pin)
+
+
+def replica_pool_stats() -> dict:
+    return {
+        engine.pool.wait_stats.name: engine.pool.wait_stats.snapshot(engine.pool)
+        for engine in replica_engines
+    }
@@ -0,0 +1,126 @@
+# app/db/schema.py
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+from app.db.base import Base
+
+
+logger = logging.getLogger(__name__)
+
+# 🔹 Extensions some indexes depend on; created before create_all()
+EXTENSIONS = ["pg_trgm"]
+
+# 🔹 create_all() only creates missing tables, so columns and indexes added to
+# existing tables are listed here and applied idempotently on startup.
+# (table name, column name)
+ADDED_COLUMNS = [
+    ("restaurants", "geo_lat"),
+    ("restaurants", "geo_lng"),
+    ("restaurants", "menu_version"),
+    ("orders", "version"),
+    # Added without its foreign key; new databases get it from create_all()
+    ("orders", "delivery_person_id"),
+]
+
+# (table name, index name)
+ADDED_INDEXES = [
+    ("restaurants", "ix_restaurants_geo"),
+    ("restaurants", "ix_restaurants_name_id"),
+    ("restaurants", "ix_restaurants_rating_id"),
+    ("restaurants", "ix_restaurants_name_trgm"),
+    # Duplicate carts are merged first (merge_duplicate_carts)
+    ("carts", "uq_carts_user_id"),
+    ("orders", "ix_orders_user_created_id"),
+    ("orders", "ix_orders_restaurant_active"),
+    ("orders", "ix_orders_delivery_person_id"),
+]
+
+
+def _index(table, name):
+    return next(index for index in table.indexes if index.name == name)
+
+
+# Older databases could hold several carts per user. Each user's lines are
+# moved into their oldest cart (quantities added where the same item is in
+# both), the other carts are dropped and the kept carts' totals recomputed.
+MERGE_CARTS_SQL = [
+    "CREATE TEMP TABLE cart_merge ON COMMIT DROP AS "
+    "SELECT id, min(id) OVER (PARTITION BY user_id) AS keep_id FROM carts",
+    "DELETE FROM cart_merge WHERE id = keep_id",
+    """
+    INSERT INTO cart_items (cart_id, menu_item_id, restaurant_id, quantity, price_per_item, total_price, notes, created_at)
+    SELECT m.keep_id, i.menu_item_id, i.restaurant_id, sum(i.quantity), max(i.price_per_item),
+           sum(i.quantity) * max(i.price_per_item), max(i.notes), min(i.created_at)
+    FROM cart_items i JOIN cart_merge m ON m.id = i.cart_id
+    GROUP BY m.keep_id, i.menu_item_id, i.restaurant_id
+    ON CONFLICT ON CONSTRAINT unique_cart_item DO UPDATE SET
+        quantity = cart_items.quantity + excluded.quantity,
+        total_price = (cart_items.quantity + excluded.quantity) * cart_items.price_per_item
+    """,
+    "DELETE FROM cart_items WHERE cart_id IN (SELECT id FROM cart_merge)",
+    "DELETE FROM carts WHERE id IN (SELECT id FROM cart_merge)",
+    """
+    UPDATE carts c SET
+        total_items = COALESCE((SELECT sum(quantity) FROM cart_items WHERE cart_id = c.id), 0),
+        total_amount = round(COALESCE((SELECT sum(total_price) FROM cart_items WHERE cart_id = c.id), 0)),
+        updated_at = now() AT TIME ZONE 'utc'
+    WHERE c.id IN (SELECT DISTINCT keep_id FROM cart_merge)
+    """,
+]
+
+
+def merge_duplicate_carts(conn):
+    for statement in MERGE_CARTS_SQL:
+        conn.execute(text(statement))
+
+
+# 🔹 Data fixes an index needs before it can be built: index name → fn(conn)
+INDEX_PREPARATIONS = {
+    "uq_carts_user_id": merge_duplicate_carts,
+}
+
+
+def create_extensions(engine):
+    with engine.begin() as conn:
+        for extension in EXTENSIONS:
+            conn.execute(text(f"CREATE EXTENSION IF NOT EXISTS {extension}"))
+
+
+def _add_column(conn, table_name, column_name):
+    column = Base.metadata.tables[table_name].c[column_name]
+    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {ddl}"))
+
+
+def _add_index(conn, table_name, index_name):
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": index_name}).scalar() is not None:
+        return
+    prepare = INDEX_PREPARATIONS.get(index_name)
+    if prepare:
+        prepare(conn)
+    conn.execute(CreateIndex(_index(Base.metadata.tables[table_name], index_name), if_not_exists=True))
+
+
+def upgrade_schema(engine) -> list:
+    """
+    Apply every ADDED_COLUMNS / ADDED_INDEXES entry, each in its own
+    transaction, so one that fails (logged, returned) doesn't roll back
+    the others.
+    """
+    steps = [(_add_column, *entry) for entry in ADDED_COLUMNS] + [(_add_index, *entry) for entry in ADDED_INDEXES]
+    failed = []
+    for step, table_name, name in steps:
+        try:
+            with engine.begin() as conn:
+                step(conn, table_name, name)
+        except Exception as e:
+            logger.error(f"Schema upgrade {table_name}.{name} failed: {e}")
+            failed.append(f"{table_name}.{name}")
+
+    if failed:
+        logger.error("Schema upgrades incomplete; failed: %s", ", ".join(failed))
+    else:
+        logger.info("Schema upgrades applied.")
+    return failed
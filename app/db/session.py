@@ -1,6 +1,8 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from dotenv import load_dotenv
+from app.db.pool import InstrumentedQueuePool, InstrumentedAsyncAdaptedQueuePool
 import os
 
 load_dotenv()
@@ -22,14 +24,70 @@ if database == "":
     raise ValueError("Missing environment variable: database")
 
 
-DATABASE_URL = f"postgresql+pg8000://{user}:{password}@{host}:{port}/{database}"
-engine = create_engine(DATABASE_URL)
+# 🔹 Driver selection. The async driver serves requests; the sync one only
+# runs create_all at startup and maintenance scripts.
+SYNC_DRIVERS = ("pg8000", "psycopg2")
+ASYNC_DRIVERS = ("asyncpg",)
+
+db_driver = os.getenv("DB_DRIVER", "pg8000")
+db_async_driver = os.getenv("DB_ASYNC_DRIVER", "asyncpg")
+if db_driver not in SYNC_DRIVERS:
+    raise ValueError(f"DB_DRIVER must be one of {SYNC_DRIVERS}, got {db_driver!r}")
+if db_async_driver not in ASYNC_DRIVERS:
+    raise ValueError(f"DB_ASYNC_DRIVER must be one of {ASYNC_DRIVERS}, got {db_async_driver!r}")
+
+
+def env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+# 🔹 Pool configuration (SQLAlchemy defaults: 5 + 10 overflow, 30s timeout)
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": env_bool("DB_POOL_PRE_PING", True),
+}
+
+
+DATABASE_URL = f"postgresql+{db_driver}://{user}:{password}@{host}:{port}/{database}"
+ASYNC_DATABASE_URL = f"postgresql+{db_async_driver}://{user}:{password}@{host}:{port}/{database}"
+# Raw libpq connection arguments, used by the LISTEN/NOTIFY listener (app/db/listener.py)
+DB_CONNECT_ARGS = {"user": user, "password": password, "host": host, "port": port, "dbname": database}
+
+# Sync engine: schema creation at startup and maintenance scripts only
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    pool_logging_name="sync",
+    **POOL_OPTIONS,
+)
 Session = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+# Async engine: every request handler. expire_on_commit=False because an
+# expired attribute would need lazy IO, which AsyncSession does not allow.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=InstrumentedAsyncAdaptedQueuePool,
+    pool_logging_name="primary",
+    **POOL_OPTIONS,
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 
-def get_db():
-    db = Session()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def pool_stats() -> dict:
+    return {
+        "driver": db_async_driver,
+        "sync_driver": db_driver,
+        "config": POOL_OPTIONS,
+        "pools": {
+            "primary": async_engine.pool.wait_stats.snapshot(async_engine.pool),
+            "sync": engine.pool.wait_stats.snapshot(engine.pool),
+        },
+    }
@@ -1,15 +1,29 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, UniqueConstraint, Boolean
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Date, DateTime, ForeignKey, Float, UniqueConstraint, Boolean, Computed, Index, Text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from app.db.base import Base
+from app.core.order_status import ACTIVE_ORDER_STATUSES
 
 
 # ---------------------------------------------------------------------
 # Utility for UTC timestamps
+# Columns are TIMESTAMP WITHOUT TIME ZONE, so store naive UTC (asyncpg
+# rejects aware datetimes for them).
 # ---------------------------------------------------------------------
 def utcnow():
-    return datetime.now(timezone.utc)
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# ---------------------------------------------------------------------
+# Numeric copy of a free-text coordinate column (NULL when it doesn't parse)
+# ---------------------------------------------------------------------
+def coordinate_from(column_name):
+    return Computed(
+        f"CASE WHEN {column_name} ~ '^\\s*[-+]?([0-9]+\\.?[0-9]*|\\.[0-9]+)\\s*$' "
+        f"THEN CAST({column_name} AS double precision) END",
+        persisted=True,
+    )
 
 
 # ---------------------------------------------------------------------
@@ -27,6 +41,9 @@ class Restaurant(Base):
     address = Column(String(500), nullable=False)
     latitude = Column(String(50), nullable=True, index=True)
     longitude = Column(String(50), nullable=True, index=True)
+    # Kept in sync by Postgres; used for the bounding-box prefilter and haversine
+    geo_lat = Column(Float, coordinate_from("latitude"), nullable=True)
+    geo_lng = Column(Float, coordinate_from("longitude"), nullable=True)
     phone_number = Column(String(20), nullable=True)
     email = Column(String(255), nullable=True)
     website_url = Column(String(255), nullable=True)
@@ -37,6 +54,8 @@ class Restaurant(Base):
     average_rating = Column(Integer, default=0)
     total_reviews = Column(Integer, default=0)
     owner_id = Column(Integer, ForeignKey('profiles.id'), nullable=False, index=True)
+    # Bumped on every menu/category change; drives menu ETags and snapshots
+    menu_version = Column(Integer, nullable=False, default=1, server_default="1")
 
     created_at = Column(DateTime, default=utcnow)
     updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
@@ -49,6 +68,16 @@ class Restaurant(Base):
     orders = relationship("Order", order_by="Order.id", back_populates="restaurant")
     reviews = relationship("Review", order_by="Review.id", back_populates="restaurant")
 
+    __table_args__ = (
+        Index("ix_restaurants_geo", "geo_lat", "geo_lng"),
+        # Keyset pagination for search (sort column + id)
+        Index("ix_restaurants_name_id", "name", "id"),
+        Index("ix_restaurants_rating_id", "average_rating", "id"),
+        # Fuzzy / substring / prefix name search (pg_trgm)
+        Index("ix_restaurants_name_trgm", "name", postgresql_using="gin",
+              postgresql_ops={"name": "gin_trgm_ops"}),
+    )
+
 
 # ---------------------------------------------------------------------
 # Menu Category
@@ -92,19 +121,51 @@ class MenuItem(Base):
     restaurant = relationship("Restaurant", back_populates="menu_items")
 
 
+# ---------------------------------------------------------------------
+# Menu Item Sales
+# Best-seller counters per menu item, updated with every order
+# (app/core/menu_popularity.py). `score` is forward-decayed: recent sales
+# weigh more, and scores stay comparable without ever being rewritten.
+# ---------------------------------------------------------------------
+class MenuItemSales(Base):
+    __tablename__ = 'menu_item_sales'
+
+    restaurant_id = Column(Integer, ForeignKey('restaurants.id', ondelete="CASCADE"), primary_key=True)
+    menu_item_id = Column(Integer, ForeignKey('menu_items.id', ondelete="CASCADE"), primary_key=True)
+    units_sold = Column(Integer, nullable=False, default=0, server_default="0")
+    order_count = Column(Integer, nullable=False, default=0, server_default="0")
+    score = Column(Float, nullable=False, default=0, server_default="0")
+
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+    __table_args__ = (
+        # Top-N per restaurant: a backward scan of one of these
+        Index("ix_menu_item_sales_restaurant_score", "restaurant_id", "score"),
+        Index("ix_menu_item_sales_restaurant_units", "restaurant_id", "units_sold"),
+    )
+
+
 # ---------------------------------------------------------------------
 # Order
+# Range-partitioned by month on created_at (app/db/partitions.py). Keys and
+# unique indexes of a partitioned table must include created_at, so the
+# primary key is (id, created_at) and other tables reference orders.id
+# without a database foreign key.
 # ---------------------------------------------------------------------
 class Order(Base):
     __tablename__ = 'orders'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    order_number = Column(String(100), unique=True, nullable=False, index=True)
+    # Not unique in the database (it lacks created_at); see new_order_number in app/api/v2/order.py
+    order_number = Column(String(100), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey('profiles.id'), nullable=False, index=True)
     restaurant_id = Column(Integer, ForeignKey('restaurants.id'), nullable=False, index=True)
     order_type = Column(String(50), nullable=False)
     status = Column(String(50), nullable=False, default='pending', index=True)
+    # Bumped by every status change; clients send it back to detect lost updates
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     delivery_address_id = Column(Integer, ForeignKey('addresses.id'))
+    delivery_person_id = Column(Integer, ForeignKey('delivery_partners.id'), nullable=True, index=True)
     scheduled_time = Column(DateTime, nullable=True)
 
     items = Column(JSONB, nullable=False)
@@ -119,31 +180,125 @@ class Order(Base):
     special_instructions = Column(String(1000), nullable=True)
     estimated_delivery_time = Column(Integer, nullable=True)
 
-    created_at = Column(DateTime, default=utcnow)
+    created_at = Column(DateTime, primary_key=True, default=utcnow)
     updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
 
     user = relationship("Profile", back_populates="orders")
     restaurant = relationship("Restaurant", back_populates="orders")
     delivery_address = relationship("Address", back_populates="orders")
+    # Joined on created_at too, so history loads only touch the order's partition
     status_history = relationship("OrderStatusHistory", order_by="OrderStatusHistory.id",
+                                  primaryjoin="and_(Order.id == foreign(OrderStatusHistory.order_id), "
+                                              "Order.created_at == foreign(OrderStatusHistory.order_created_at))",
                                   back_populates="order", cascade="all, delete-orphan")
-    reviews = relationship("Review", back_populates="order")
+    reviews = relationship("Review", primaryjoin="Order.id == foreign(Review.order_id)", back_populates="order")
+    delivery_person = relationship("DeliveryPartner", back_populates="orders")
+
+    __table_args__ = (
+        # A user's order history, newest first, paged by (created_at, id)
+        Index("ix_orders_user_created_id", "user_id", "created_at", "id"),
+        # Open orders per restaurant (live queue snapshot); stays small however
+        # many orders a restaurant has completed
+        Index("ix_orders_restaurant_active", "restaurant_id", "created_at",
+              postgresql_where=status.in_(ACTIVE_ORDER_STATUSES)),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+# ---------------------------------------------------------------------
+# Delivery Partner
+# Last-known location is written in batches by the dispatcher
+# (app/core/dispatch.py), not on every ping.
+# ---------------------------------------------------------------------
+class DeliveryPartner(Base):
+    __tablename__ = 'delivery_partners'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    profile_id = Column(Integer, ForeignKey('profiles.id'), unique=True, nullable=False, index=True)
+    vehicle_type = Column(String(50), nullable=True)
+    status = Column(String(20), nullable=False, default='offline', index=True)  # offline | available | busy
+
+    last_latitude = Column(Float, nullable=True)
+    last_longitude = Column(Float, nullable=True)
+    last_seen_at = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+    orders = relationship("Order", back_populates="delivery_person")
 
 
 # ---------------------------------------------------------------------
 # Order Status History
+# Partitioned by its order's created_at, so an order and its history share
+# a month and are archived together.
 # ---------------------------------------------------------------------
 class OrderStatusHistory(Base):
     __tablename__ = 'order_status_history'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    order_id = Column(Integer, ForeignKey('orders.id'), nullable=False, index=True)
+    order_id = Column(Integer, nullable=False, index=True)
+    order_created_at = Column(DateTime, primary_key=True)
     status = Column(String(50), nullable=False)
     updated_by = Column(String(255), nullable=False)
 
     timestamp = Column(DateTime, default=utcnow, index=True)
 
-    order = relationship("Order", back_populates="status_history")
+    order = relationship("Order", primaryjoin="and_(Order.id == foreign(OrderStatusHistory.order_id), "
+                                              "Order.created_at == foreign(OrderStatusHistory.order_created_at))",
+                         back_populates="status_history")
+
+    __table_args__ = (
+        {"postgresql_partition_by": "RANGE (order_created_at)"},
+    )
+
+
+# ---------------------------------------------------------------------
+# Restaurant Sales Rollup
+# Hourly counters per restaurant, bucketed on the order's created_at (UTC)
+# and updated in the same transaction as the order writes
+# (app/core/sales_rollup.py). Analytics read only this table.
+# ---------------------------------------------------------------------
+class RestaurantSalesRollup(Base):
+    __tablename__ = 'restaurant_sales_rollups'
+
+    restaurant_id = Column(Integer, ForeignKey('restaurants.id', ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    hour = Column(SmallInteger, primary_key=True)  # 0-23
+
+    orders_placed = Column(Integer, nullable=False, default=0, server_default="0")
+    gross_amount = Column(BigInteger, nullable=False, default=0, server_default="0")
+    items_sold = Column(Integer, nullable=False, default=0, server_default="0")  # net of cancellations
+    # Cancelled and rejected orders; subtracted to get net figures
+    orders_cancelled = Column(Integer, nullable=False, default=0, server_default="0")
+    cancelled_amount = Column(BigInteger, nullable=False, default=0, server_default="0")
+    orders_delivered = Column(Integer, nullable=False, default=0, server_default="0")
+    delivered_amount = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+
+# ---------------------------------------------------------------------
+# Idempotency Key
+# The response first returned for a client-supplied Idempotency-Key, so a
+# retried request is answered without creating a second order.
+# ---------------------------------------------------------------------
+class IdempotencyKey(Base):
+    __tablename__ = 'idempotency_keys'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey('profiles.id', ondelete="CASCADE"), nullable=False)
+    scope = Column(String(50), nullable=False)       # endpoint the key was used on
+    key = Column(String(255), nullable=False)
+    fingerprint = Column(String(64), nullable=False)  # sha256 of the request body
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(Text, nullable=False)      # serialized JSON, replayed as-is
+
+    created_at = Column(DateTime, default=utcnow, index=True)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'scope', 'key', name='unique_idempotency_key'),
+    )
 
 
 # ---------------------------------------------------------------------
@@ -155,7 +310,7 @@ class Review(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('profiles.id'), nullable=False, index=True)
     restaurant_id = Column(Integer, ForeignKey('restaurants.id'), nullable=False, index=True)
-    order_id = Column(Integer, ForeignKey('orders.id'), nullable=False, index=True)
+    order_id = Column(Integer, nullable=False, index=True)  # orders is partitioned; no foreign key
     rating = Column(Integer, nullable=False, index=True)
     review_text = Column(String(2000), nullable=True)
 
@@ -164,7 +319,8 @@ class Review(Base):
 
     user = relationship("Profile", back_populates="reviews")
     restaurant = relationship("Restaurant", back_populates="reviews")
-    order = relationship("Order", back_populates="reviews", uselist=False)
+    order = relationship("Order", primaryjoin="Order.id == foreign(Review.order_id)",
+                         back_populates="reviews", uselist=False)
 
 
 # ---------------------------------------------------------------------
@@ -174,7 +330,7 @@ class Cart(Base):
     __tablename__ = "carts"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey('profiles.id'), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('profiles.id'), nullable=False)
     total_amount = Column(Integer, nullable=False)
     total_items = Column(Integer, nullable=False)
 
@@ -185,6 +341,11 @@ class Cart(Base):
     items = relationship("CartItem", order_by="CartItem.id",
                          back_populates="cart", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # One cart per user; also the conflict target for the cart upsert
+        Index("uq_carts_user_id", "user_id", unique=True),
+    )
+
 
 # ---------------------------------------------------------------------
 # Cart Item
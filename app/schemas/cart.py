@@ -1,5 +1,5 @@
-from pydantic import BaseModel, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Annotated, List, Literal, Optional, Union
 
 
 # ─────────────────────────────────────────────
@@ -44,3 +44,36 @@ class CartResponse(BaseModel):
     items: List[CartItemResponse]
 
     model_config = ConfigDict(from_attributes=True)
+
+
+# ─────────────────────────────────────────────
+# Batch Schemas — applied in order, all or nothing
+# ─────────────────────────────────────────────
+
+class CartBatchAdd(CartItemBase):
+    op: Literal["add"]
+
+
+class CartBatchUpdate(BaseModel):
+    op: Literal["update"]
+    item_id: int
+    quantity: int
+
+
+class CartBatchRemove(BaseModel):
+    op: Literal["remove"]
+    item_id: int
+
+
+class CartBatchClear(BaseModel):
+    op: Literal["clear"]
+
+
+CartBatchOperation = Annotated[
+    Union[CartBatchAdd, CartBatchUpdate, CartBatchRemove, CartBatchClear],
+    Field(discriminator="op"),
+]
+
+
+class CartBatchRequest(BaseModel):
+    operations: List[CartBatchOperation] = Field(..., min_length=1, max_length=100)
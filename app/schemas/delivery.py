@@ -0,0 +1,49 @@
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from datetime import datetime
+
+
+# -----------------------------
+# Delivery Partner Schemas
+# -----------------------------
+class DeliveryPartnerCreate(BaseModel):
+    vehicle_type: Optional[str] = None
+
+
+class DeliveryPartnerResponse(BaseModel):
+    id: int
+    profile_id: int
+    vehicle_type: Optional[str]
+    status: str
+    last_latitude: Optional[float]
+    last_longitude: Optional[float]
+    last_seen_at: Optional[datetime]
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
+# 'busy' is only set by dispatch and cleared when the order finishes
+class AvailabilityUpdate(BaseModel):
+    status: Literal["available", "offline"]
+
+
+class LocationPing(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+
+# -----------------------------
+# Dispatch Schemas
+# -----------------------------
+class DispatchAssignment(BaseModel):
+    order_id: int
+    delivery_person_id: int
+    distance_km: float
+
+
+class DispatchResult(BaseModel):
+    assigned: List[DispatchAssignment]
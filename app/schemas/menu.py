@@ -50,3 +50,55 @@ class MenuItemResponse(MenuItemBase):
 
     class Config:
         orm_mode = True
+
+
+# Best sellers: counters from menu_item_sales. `score` is units sold with
+# recent sales weighted more (forward decay; only its ordering is meaningful)
+class PopularMenuItem(MenuItemResponse):
+    units_sold: int
+    order_count: int
+    score: float
+
+
+# Full nested menu: categories with their available items
+class MenuCategoryWithItems(MenuCategoryResponse):
+    items: List[MenuItemResponse] = Field(default_factory=list, validation_alias="menu_items")
+
+
+class FullMenuResponse(BaseModel):
+    restaurant_id: int
+    menu_version: int
+    categories: List[MenuCategoryWithItems]
+
+
+# Bulk create/update: an operation with an id updates that item (omitted
+# fields are left unchanged), one without an id creates a new item.
+MAX_BULK_MENU_ITEMS = 500
+
+
+class MenuItemBulkOperation(BaseModel):
+    id: Optional[int] = None
+    category_id: Optional[int] = None
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = None
+    is_available: Optional[bool] = None
+
+
+class MenuItemBulkRequest(BaseModel):
+    items: List[MenuItemBulkOperation] = Field(..., min_length=1, max_length=MAX_BULK_MENU_ITEMS)
+
+
+class MenuItemBulkResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    status: str  # created | updated | error
+    detail: Optional[str] = None
+
+
+class MenuItemBulkResponse(BaseModel):
+    menu_version: int
+    created: int
+    updated: int
+    failed: int
+    results: List[MenuItemBulkResult]
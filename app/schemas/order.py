@@ -6,6 +6,23 @@ from datetime import datetime
 # -----------------------------
 # Order Item Schema
 # -----------------------------
+MAX_ORDER_LINE_QUANTITY = 100
+MAX_ORDER_LINES = 100
+MAX_ITEM_ID = 2 ** 31 - 1
+
+
+# The part of a client's line that sales counters read (app/core/order_lines.py);
+# strict, so "2" or 2.0 is refused rather than counted differently later
+class OrderLine(BaseModel):
+    item_id: int = Field(..., ge=1, le=MAX_ITEM_ID)
+    quantity: int = Field(..., ge=1, le=MAX_ORDER_LINE_QUANTITY)
+
+    model_config = {
+        "strict": True,
+        "extra": "allow"
+    }
+
+
 class OrderItem(BaseModel):
     item_id: int
     name: Optional[str] = None
@@ -35,7 +52,7 @@ class OrderBase(BaseModel):
     restaurant_id: int
     delivery_address_id: Optional[int] = None
     order_type: str
-    items: List[Any]
+    items: List[OrderLine] = Field(..., max_length=MAX_ORDER_LINES)
     subtotal_amount: int
     discount_amount: Optional[int] = 0
     delivery_fee: Optional[int] = 0
@@ -53,6 +70,18 @@ class OrderCreate(OrderBase):
     pass
 
 
+# -----------------------------
+# Checkout Schema (POST /orders/checkout)
+# Items and amounts come from the user's cart, priced server-side
+# -----------------------------
+class CheckoutRequest(BaseModel):
+    delivery_address_id: Optional[int] = None
+    order_type: str
+    payment_method: str
+    special_instructions: Optional[str] = None
+    scheduled_time: Optional[datetime] = None
+
+
 # -----------------------------
 # Response Schema
 # -----------------------------
@@ -63,9 +92,11 @@ class OrderResponse(BaseModel):
     user_id: int
     restaurant_id: int
     delivery_address_id: Optional[int]
+    delivery_person_id: Optional[int] = None
 
     order_type: str
     status: str
+    version: int
     scheduled_time: Optional[datetime]
 
     items: List[Any]  # expanded list of items
@@ -91,12 +122,36 @@ class OrderResponse(BaseModel):
     }
 
 
+# -----------------------------
+# Summary Schema (order history lists)
+# No items or status history; GET /orders/{id} has the full order
+# -----------------------------
+class OrderSummary(BaseModel):
+    id: int
+    order_number: str
+    restaurant_id: int
+    delivery_person_id: Optional[int] = None
+    order_type: str
+    status: str
+    version: int
+    total_amount: int
+    payment_status: str
+    scheduled_time: Optional[datetime]
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
 # -----------------------------
 # Status Update Schema
 # -----------------------------
 class OrderStatusUpdate(BaseModel):
     status: str
     updated_by: str  # restaurant admin or delivery partner
+    version: Optional[int] = None  # the version last seen; a stale one gets 409
 
 
 # -----------------------------
@@ -104,3 +159,4 @@ class OrderStatusUpdate(BaseModel):
 # -----------------------------
 class OrderCancel(BaseModel):
     reason: Optional[str] = Field(default="User cancelled the order")
+    version: Optional[int] = None
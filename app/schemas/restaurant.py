@@ -1,6 +1,7 @@
 #pydantic schemas for restaurant creation and display
 from pydantic import BaseModel, ConfigDict
-from datetime import datetime
+from datetime import date, datetime
+from typing import Literal
 
 class RestaurantCreate(BaseModel):
     name: str
@@ -47,6 +48,14 @@ class Restaurant(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class RestaurantSuggestion(BaseModel):
+    id: int
+    slug: str
+    name: str
+    logo_url: str | None = None
+
+    model_config = ConfigDict(from_attributes=True)
+
 class RestaurantUpdate(BaseModel):
     name: str | None = None
     description: str | None = None
@@ -76,4 +85,25 @@ class MenuCategory(BaseModel):
     updated_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
-    
\ No newline at end of file
+    
+
+# Sales analytics, read from restaurant_sales_rollups. Counts and revenue
+# are net of cancelled / rejected orders; hours are UTC.
+class SalesBucket(BaseModel):
+    day: date | None = None
+    hour: int | None = None
+    orders: int
+    revenue: int
+    average_ticket: float
+    items_sold: int
+    cancelled_orders: int
+    delivered_orders: int
+    delivered_revenue: int
+
+class SalesAnalytics(BaseModel):
+    restaurant_id: int
+    date_from: date
+    date_to: date
+    granularity: Literal["day", "hour"]
+    totals: SalesBucket
+    buckets: list[SalesBucket]
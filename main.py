@@ -14,8 +14,16 @@ from app.core import firebase
 import logging
 from sqlalchemy.exc import OperationalError
 from app.db.base import Base
-from app.db.session import engine
+from app.db.session import engine, async_engine
+from app.db.replicas import ReadYourWritesMiddleware, replica_engines
+from app.db.schema import create_extensions, upgrade_schema
+from app.db.partitions import ensure_partitions
 from app.api.v2 import router
+from app.core.revocation import revocation_watermarks
+from app.db.listener import pg_listener
+from app.db.maintenance import maintenance
+from app.core.cart_store import cart_store
+from app.core.dispatch import dispatcher
 from fastapi.security import HTTPBearer
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -39,16 +47,40 @@ app.add_middleware(
     allow_credentials=True,       # REQUIRED for cookies/auth
     allow_methods=["*"],          # Allow all methods (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"],          # Allow all headers
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "Idempotent-Replayed"],  # Response headers readable by JS
 )
 
+# Pin clients to the primary for a few seconds after they write (read replicas)
+app.add_middleware(ReadYourWritesMiddleware)
+
 @app.on_event("startup")
 def on_startup():
     create_tables(engine)
+    revocation_watermarks.start()
+    pg_listener.start()
+    maintenance.start()
+    cart_store.start()
+    dispatcher.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    # Persist write-behind carts while the engine is still open
+    await cart_store.stop()
+    await dispatcher.stop()
+    revocation_watermarks.stop()
+    pg_listener.stop()
+    maintenance.stop()
+    await async_engine.dispose()
+    for replica in replica_engines:
+        await replica.dispose()
 
 def create_tables(engine):
     try:
         logger.info("Attempting to create tables...")
+        create_extensions(engine)
         Base.metadata.create_all(bind=engine)
+        upgrade_schema(engine)
+        ensure_partitions(engine)
         logger.info("Tables created successfully.")
     except OperationalError as e:
         logger.error("Could not connect to the database. Please check your connection details and ensure the database exists.")